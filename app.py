@@ -4,36 +4,43 @@ st.set_page_config(page_title="BSA / AML Detection System", layout="wide")
 
 # Rest of the imports
 import pandas as pd
-import numpy as np
-import plotly.express as px
 import logging
-from sar_groq import generate_sar_narrative
-from red_flag_rules import (detect_high_value_cash_deposits, detect_structured_transactions,
-                            detect_high_risk_country_transactions, 
-                            detect_high_velocity_cash_activity,
-                            detect_keywords_hitting, detect_unusual_transaction_patterns,
-                            detect_large_incoming_wires)
+import hashlib
+import json
+import os
+# SAR narrative backend: 'groq' (cloud), or 'local' / 'stub' for offline drafting
+if os.environ.get('SARGEN_SAR_BACKEND', 'groq') == 'groq':
+    from sar_groq import generate_sar_narrative, generate_sar_narrative_async, PROMPT_TEMPLATE
+    generate_sar_narratives_async, DRAFT_BATCH_SIZE = None, 1
+else:
+    # The local backends draft several customers per call, so batch drafts go through generate_batch
+    from sar_local import (generate_sar_narrative, generate_sar_narrative_async, generate_sar_narratives_async,
+                           PROMPT_TEMPLATE, MAX_BATCH_SIZE as DRAFT_BATCH_SIZE)
+from red_flag_rules import RULES, THRESHOLD_SWEEPS, get_customers_with_multiple_violations, reference_data_signature
 from modules.visualization import (create_transaction_amount_distribution,
                                  create_violations_summary,
                                  create_customer_dashboard,
                                  create_preview_dashboard,
                                  create_summary_metrics,
+                                 create_threshold_sweep_chart,
                                  VisualizationTheme)  # Add VisualizationTheme to imports
-from modules.data_processing import TransactionProcessor
+from modules.data_processing import TransactionProcessor, frame_fingerprint, parse_dates
+from modules.backtesting import DEFAULT_POINTS, current_threshold, sweep_parameters
+from modules.data_grid import render_data_grid
+from modules.ingestion import EXTRACTS_ROOT, load_extracts, resolve_paths
+from modules.text_fingerprints import near_duplicate_evidence
+from modules.profiling import Profiler, activate, profiled, span
+from modules.jobs import JobQueue, DONE, FAILED, backtest_job, detection_job, narrative_job
+from modules.case_store import CaseStore
+from modules.baselines import ProfileStore
+from modules.async_drafts import AsyncDraftRunner
+from modules.sar_export import EXPORTS_DIR, export_sar_cases
 
 # Apply unified styling at the start
 st.markdown(VisualizationTheme.get_css(), unsafe_allow_html=True)
 
 # Define red flag rules
-red_flag_rules = [
-    'high_value_cash_deposits',
-    'structured_transactions',
-    'high_risk_country_transactions',
-    'high_velocity_cash_activity',
-    'keywords_hitting',
-    'unusual_transaction_patterns',
-    'large_incoming_wires'
-]
+red_flag_rules = list(RULES)
 
 # Helper Functions
 def format_sar_narrative(narrative):
@@ -73,8 +80,11 @@ def display_sar_narrative(narrative, customer_id):
         key=f"sar_narrative_{customer_id}"  # Make key unique for each customer
     )
 
+@profiled('viz:flagged_transaction_visual')
 def create_flagged_transaction_visual(data, title):
     """Create consistent visualization for flagged transactions"""
+    import plotly.express as px
+
     fig = px.histogram(
         data,
         x="amount",
@@ -162,63 +172,247 @@ if 'processor' not in st.session_state:
     st.session_state.processor = TransactionProcessor()
 if 'sar_narratives' not in st.session_state:
     st.session_state.sar_narratives = {}
+if 'sar_jobs' not in st.session_state:
+    st.session_state.sar_jobs = {}
+if 'job_results' not in st.session_state:
+    st.session_state.job_results = {}
+if 'sar_drafts' not in st.session_state:
+    st.session_state.sar_drafts = {}
+
+
+@st.cache_resource
+def get_job_queue():
+    """One background worker pool shared by every session on this server"""
+    return JobQueue()
+
+job_queue = get_job_queue()
+
+
+@st.cache_resource
+def get_case_store():
+    return CaseStore()
+
+case_store = get_case_store()
+
+
+@st.cache_resource
+def get_profile_store():
+    """Customer baselines persisted across uploads, shared by every session on this server"""
+    return ProfileStore()
+
+profile_store = get_profile_store()
+
+
+@st.cache_resource
+def get_draft_runner():
+    """One asyncio loop for batch SAR drafting, shared by every session on this server"""
+    return AsyncDraftRunner(generate_sar_narrative_async, generate_batch_async=generate_sar_narratives_async,
+                            batch_size=DRAFT_BATCH_SIZE)
+
+draft_runner = get_draft_runner()
 
 
 # Data Processing Module
 def load_data(file):
     try:
-        data = pd.read_csv(file)
+        with span('load_data') as record:
+            data = pd.read_csv(file)
+            data['date'] = parse_dates(data['date'])
+            record['rows'] = len(data)
         return data
     except Exception as e:
         st.error(f"Error loading data: {e}")
         return None
 
-# Red Flag Rules Module
-def apply_red_flag_rules(transactions, selected_rules, customer_id=None):
-    rules = {
-        'high_value_cash_deposits': detect_high_value_cash_deposits,
-        'structured_transactions': detect_structured_transactions,
-        'high_risk_country_transactions': detect_high_risk_country_transactions,
-        # 'rapid_movement_of_funds': detect_rapid_movement_of_funds,
-        # 'inconsistent_business_activity': detect_inconsistent_business_activity,
-        'high_velocity_cash_activity': detect_high_velocity_cash_activity,
-        'keywords_hitting': detect_keywords_hitting,
-        'unusual_transaction_patterns': detect_unusual_transaction_patterns,
-        # 'commingling_of_funds': detect_commingling_of_funds,
-        'large_incoming_wires': detect_large_incoming_wires,
-    }
-
-    flagged_transactions = {}
-    for rule_name in selected_rules:
-        if rule_name in rules:
-            if customer_id:
-                customer_transactions = transactions[transactions['customer_id'] == customer_id]
-                flagged_transactions[rule_name] = rules[rule_name](customer_transactions)
-            else:
-                flagged_transactions[rule_name] = rules[rule_name](transactions)
-    
-    return flagged_transactions
-
-# Function to get customers with multiple rule violations
-def get_customers_with_multiple_violations(flagged_transactions):
-    customer_violations = {}
-    for rule, dataset in flagged_transactions.items():
-        for customer_id in dataset['customer_id']:
-            if customer_id not in customer_violations:
-                customer_violations[customer_id] = set()
-            customer_violations[customer_id].add(rule)
-    return {customer: rules for customer, rules in customer_violations.items() if len(rules) > 1}
+# cache_resource hands every rerun the same frame instead of unpickling a copy; callers
+# must not modify it in place
+@st.cache_resource(show_spinner="Loading transaction extracts...", max_entries=4)
+def _load_extracts_cached(source, file_signature):
+    return load_extracts(source, root=EXTRACTS_ROOT)
 
-# Function to generate and display SAR narrative
-def generate_and_display_sar(customer, rules):
-    customer_transactions = transactions[transactions['customer_id'] == customer]
+def load_extracts_data(source):
+    """Loads a directory or glob of extracts in parallel, reporting per-file timings and errors"""
     try:
-        sar_narrative = generate_sar_narrative(customer, rules, customer_transactions.to_dict('records'))
-        st.session_state['sar_narratives'][customer] = sar_narrative
-        display_sar_narrative(sar_narrative, customer)  # Pass customer ID
+        # Size and mtime of every file, so new or rewritten extracts invalidate the cache
+        file_signature = tuple((path, os.path.getsize(path), os.path.getmtime(path))
+                               for path in resolve_paths(source, EXTRACTS_ROOT))
+        with span('load_extracts') as record:
+            data, report = _load_extracts_cached(source, file_signature)
+            record['rows'] = 0 if data is None else len(data)
     except Exception as e:
-        logging.error(f"Error generating SAR narrative: {e}")  # Log the error
-        st.error(f"An error occurred while generating the SAR narrative. Please check the logs for details.")
+        st.error(f"Error loading data: {e}")
+        return None
+    failed = report[report['error'].notna()]
+    with st.sidebar.expander(f"Loaded {len(report) - len(failed)} of {len(report)} files"):
+        st.dataframe(report, hide_index=True)
+    for _, row in failed.iterrows():
+        st.warning(f"Skipped {row['file']}: {row['error']}")
+    return data
+
+def make_job_key(kind, *parts):
+    return f"{kind}:" + hashlib.sha1(json.dumps(parts, default=str).encode()).hexdigest()
+
+@st.fragment(run_every=1)
+def show_job_progress(job_id, label):
+    """Polls a running job and reruns the app once it has finished"""
+    job = job_queue.status(job_id)
+    if job['status'] in (DONE, FAILED):
+        st.rerun()
+    st.progress(job['progress'], text=f"{label}: {job['message'] or job['status']}")
+
+def fetch_job_result(job_id, label):
+    """Returns the job's result, or None while it is still running (showing its progress).
+
+    The session keeps only the latest result of each job kind; older ones are reloaded
+    from the job store when asked for again.
+    """
+    for cached_id, result in st.session_state['job_results'].values():
+        if cached_id == job_id:
+            return result
+    job = job_queue.status(job_id)
+    if job is None:
+        st.info(f"{label}: the stored result has expired. Run it again.")
+        return None
+    if job['status'] == DONE:
+        result = job_queue.result(job_id)
+        st.session_state['job_results'][job['kind']] = (job_id, result)
+        # The job ran on a worker thread; show its spans in this session's metrics
+        profiler.spans.extend(job_queue.spans(job_id))
+        return result
+    if job['status'] == FAILED:
+        logging.error(f"{label} failed: {job['error']}")
+        st.error(f"{label} failed. Please check the logs for details.")
+        return None
+    show_job_progress(job_id, label)
+    return None
+
+def detection_key(fingerprint, selected_rules, customer_id=None):
+    """Job key of a detection run; also identifies its flagged frames"""
+    return make_job_key('detection', fingerprint, selected_rules, customer_id, reference_data_signature())
+
+def run_detection(transactions, selected_rules, customer_id=None, fingerprint=None):
+    """Applies rules in a background job; returns None until the flagged transactions are ready"""
+    fingerprint = frame_fingerprint(transactions) if fingerprint is None else fingerprint
+    job_id = job_queue.submit(
+        'detection', detection_job, transactions, list(selected_rules), customer_id=customer_id,
+        profile_store=profile_store,
+        job_key=detection_key(fingerprint, selected_rules, customer_id),
+        params={'rules': list(selected_rules), 'customer_id': customer_id}
+    )
+    return fetch_job_result(job_id, "Applying red flag rules")
+
+def near_duplicate_evidence_cached(transactions, fingerprint):
+    """near_duplicate_evidence for the frame, clustered once per frame rather than per customer"""
+    cached = st.session_state.get('near_duplicate_evidence')
+    if cached is None or cached[0] != fingerprint:
+        cached = (fingerprint, near_duplicate_evidence(transactions))
+        st.session_state['near_duplicate_evidence'] = cached
+    return cached[1]
+
+def sar_records(customer, rules, records=None):
+    """The transaction records sent to the model for a customer's SAR"""
+    if records is None:
+        records = transactions[transactions['customer_id'] == customer].to_dict('records')
+    if 'near_duplicate_descriptions' in rules:
+        # Cluster facts the model cannot see from this customer's rows alone
+        evidence = near_duplicate_evidence_cached(transactions, transactions_key)
+        records = [dict(record, near_duplicate_memo=evidence[record['transaction_id']])
+                   if record['transaction_id'] in evidence else record for record in records]
+    return records
+
+# Function to generate and display SAR narrative
+def generate_and_display_sar(customer, rules, records=None, force=False):
+    """Queues a SAR narrative job for the customer; the draft appears once the job finishes.
+
+    An earlier draft for the same inputs is reused unless force is set.
+    """
+    rules = sorted(rules)
+    records = sar_records(customer, rules, records)
+    st.session_state['sar_narratives'].pop(customer, None)
+    st.session_state['sar_drafts'].pop(customer, None)
+    st.session_state['sar_jobs'][customer] = job_queue.submit(
+        'narrative', narrative_job, customer, rules, records, generate_sar_narrative,
+        job_key=PROMPT_TEMPLATE.cache_key(customer, rules, records), force=force,
+        params={'customer_id': customer, 'rules': rules, 'template': PROMPT_TEMPLATE.key}
+    )
+
+def draft_all_sars(customer_rules):
+    """Dispatches batch drafts for every customer that has no narrative and none in progress"""
+    drafts = []
+    for customer, rules in customer_rules.items():
+        job = job_queue.status(st.session_state['sar_jobs'].get(customer))
+        if customer in st.session_state['sar_narratives'] or (
+                job is not None and job['status'] not in (DONE, FAILED)):
+            continue
+        st.session_state['sar_jobs'].pop(customer, None)
+        rules = sorted(rules)
+        records = sar_records(customer, rules)
+        key = PROMPT_TEMPLATE.cache_key(customer, rules, records)
+        st.session_state['sar_drafts'][customer] = key
+        drafts.append((key, customer, rules, records))
+    return draft_runner.submit_many(drafts)
+
+@st.fragment(run_every=1)
+def show_draft_progress(customer):
+    """Polls a batch draft and reruns the app once it has finished or failed"""
+    draft = draft_runner.status(st.session_state['sar_drafts'][customer])
+    if draft is None or draft['status'] in (DONE, FAILED):
+        st.rerun()
+    st.info(f"Drafting SAR narrative ({draft['status']})...")
+
+def display_pending_sar(customer, rules, records=None):
+    """Shows the customer's SAR narrative, or the drafting progress while its job runs"""
+    if customer in st.session_state['sar_drafts'] and customer not in st.session_state['sar_narratives']:
+        key = st.session_state['sar_drafts'][customer]
+        draft = draft_runner.status(key)
+        if draft is None:
+            st.session_state['sar_drafts'].pop(customer, None)
+        elif draft['status'] == DONE:
+            st.session_state['sar_narratives'][customer] = draft['narrative']
+        elif draft['status'] == FAILED:
+            st.error(f"Drafting the SAR narrative failed: {draft['error']}")
+            if st.button("Retry", key=f"retry_draft_{customer}"):
+                draft_runner.retry(key)
+                st.rerun()
+            return
+        else:
+            show_draft_progress(customer)
+            return
+    job_id = st.session_state['sar_jobs'].get(customer)
+    if job_id and customer not in st.session_state['sar_narratives']:
+        sar_narrative = fetch_job_result(job_id, f"SAR narrative for customer {customer}")
+        if sar_narrative is not None:
+            st.session_state['sar_narratives'][customer] = sar_narrative
+    if customer in st.session_state['sar_narratives']:
+        display_sar_narrative(st.session_state['sar_narratives'][customer], customer)  # Pass customer ID
+        if st.button("Regenerate SAR Narrative", key=f"regenerate_sar_{customer}"):
+            generate_and_display_sar(customer, rules, records, force=True)
+            st.rerun()
+
+def export_sar_drafts(flagged_transactions, rules_by_customer):
+    """Exports every drafted narrative with its evidence in a background job, then offers the files"""
+    drafted = {customer: narrative for customer, narrative in st.session_state['sar_narratives'].items()
+               if customer in rules_by_customer}
+    st.caption(f"{len(drafted):,} drafted narratives ready to export as JSONL, FinCEN-style records "
+               f"and a zip of per-case documents.")
+    if st.button("Export SAR Drafts", disabled=not drafted):
+        # The flagged frames are the evidence bundle; re-running detection on new data changes it
+        export_key = make_job_key('export', sorted(drafted.items()), PROMPT_TEMPLATE.key,
+                                  {rule: frame_fingerprint(data) for rule, data in flagged_transactions.items()})
+        st.session_state['export_job'] = job_queue.submit(
+            'export', export_sar_cases, drafted, flagged_transactions,
+            os.path.join(EXPORTS_DIR, export_key.split(':')[1][:16]),
+            rules_by_customer={customer: sorted(rules_by_customer[customer]) for customer in drafted},
+            template_key=PROMPT_TEMPLATE.key,
+            job_key=export_key, params={'cases': len(drafted), 'template': PROMPT_TEMPLATE.key}
+        )
+    if 'export_job' in st.session_state:
+        export = fetch_job_result(st.session_state['export_job'], "Exporting SAR drafts")
+        if export is not None:
+            columns = st.columns(len(export['paths']))
+            for column, (name, path) in zip(columns, export['paths'].items()):
+                with column, open(path, 'rb') as f:
+                    st.download_button(f"Download {name}", f.read(), file_name=name, key=f"download_{name}")
 
 # Streamlit App
 st.title("Bank Secrecy Act (BSA) / Anti-Money Laundering (AML) Detection System")
@@ -227,16 +421,49 @@ st.title("Bank Secrecy Act (BSA) / Anti-Money Laundering (AML) Detection System"
 with st.sidebar:
     st.header("Upload and Options")
     uploaded_file = st.file_uploader("Upload Transaction Data (CSV)", type=["csv"])
-    option = st.selectbox("Choose an action", ("Preview Data", "Apply Red Flag Rules", "Generate SAR for Selected Transactions", "Search Customers with Multiple Violations"))
-
-if uploaded_file is not None:
-    transactions = load_data(uploaded_file)
+    extracts_source = st.text_input(
+        f"Or load extracts from a directory or glob under {EXTRACTS_ROOT}",
+        help="Every .csv, .csv.gz and .csv.zst file under a directory, or a pattern such as 2024-05-*.csv.gz"
+    ).strip()
+    option = st.selectbox("Choose an action", ("Preview Data", "Apply Red Flag Rules", "Generate SAR for Selected Transactions", "Search Customers with Multiple Violations", "Threshold Backtesting", "Customer Case History"))
+    show_performance = st.checkbox("Show performance metrics", value=False)
+
+# Fresh profiler per run; memory tracking only when the debug panel is shown
+profiler = activate(Profiler(track_memory=show_performance))
+
+if option == "Customer Case History":
+    create_section_header("Customer Case History")
+    history_customer = st.text_input("Customer ID").strip()
+    if history_customer:
+        history = case_store.customer_history(history_customer)
+        if history.empty:
+            st.info("No stored hits for this customer.")
+        else:
+            history['rules'] = history['rules'].str.join(', ')
+            render_data_grid(
+                history.drop(columns=['rule_mask', 'narrative_ref', 'narrative']),
+                key="case_history"
+            )
+            for narrative in history['narrative'].dropna().unique():
+                with st.expander("Stored SAR Narrative"):
+                    st.text(narrative)
+
+elif uploaded_file is not None or extracts_source:
+    if uploaded_file is not None:
+        transactions = load_data(uploaded_file)
+    else:
+        transactions = load_extracts_data(extracts_source)
     if transactions is not None:
+        # Hashed once per rerun; everything keyed on the frame reuses it
+        transactions_key = frame_fingerprint(transactions)
         if option == "Preview Data":
             create_section_header("Transaction Overview")
             
             # Create and display metrics with improved spacing
-            metrics = create_summary_metrics(transactions)
+            customer_summaries = st.session_state.processor.customer_summaries(transactions, transactions_key)
+            metrics = create_summary_metrics(
+                transactions, TransactionProcessor.overall_summary(customer_summaries)
+            )
             metric_cols = st.columns(len(metrics))
             for col, (_, metric) in zip(metric_cols, metrics.items()):
                 with col:
@@ -253,7 +480,7 @@ if uploaded_file is not None:
             st.markdown("<br>", unsafe_allow_html=True)
             
             # Create and display visualizations with interaction config
-            volume_fig, amount_fig, types_fig = create_preview_dashboard(transactions)
+            volume_fig, amount_fig, types_fig = create_preview_dashboard(transactions, customer_summaries)
             
             col1, col2 = st.columns(2)
             with col1:
@@ -308,19 +535,28 @@ if uploaded_file is not None:
 
             if st.button("Apply Selected Red Flag Rules"):
                 if selected_rules:  # Changed from if/return to if/else
-                    flagged_transactions = apply_red_flag_rules(
-                        transactions, 
-                        selected_rules, 
-                        customer_id=None if selected_customer == 'All' else selected_customer
+                    st.session_state['rule_request'] = (
+                        list(selected_rules),
+                        None if selected_customer == 'All' else selected_customer
                     )
-                    
+                else:
+                    st.warning("Please select at least one rule to apply")
+
+            # Kept in session state so the results outlive the button click
+            rule_request = st.session_state.get('rule_request')
+            if rule_request:
+                flagged_transactions = run_detection(transactions, rule_request[0], customer_id=rule_request[1],
+                                                     fingerprint=transactions_key)
+                flagged_key = detection_key(transactions_key, rule_request[0], rule_request[1])
+                if flagged_transactions is not None:
                     st.markdown("### Flagged Transactions Analysis")
-                    for name in selected_rules:
+                    for name in rule_request[0]:
                         if name in flagged_transactions and not flagged_transactions[name].empty:
                             with st.expander(f"🚩 {name.replace('_', ' ').title()}", expanded=True):
                                 col1, col2 = st.columns([2, 1])
                                 with col1:
-                                    st.dataframe(flagged_transactions[name])
+                                    render_data_grid(flagged_transactions[name], key=f"flagged_{name}",
+                                                     fingerprint=f"{flagged_key}:{name}")
                                 with col2:
                                     fig = create_flagged_transaction_visual(
                                         flagged_transactions[name],
@@ -331,21 +567,40 @@ if uploaded_file is not None:
                                         use_container_width=True,
                                         config=VisualizationTheme.INTERACTION_CONFIG
                                     )
-                else:
-                    st.warning("Please select at least one rule to apply")
 
         elif option == "Generate SAR for Selected Transactions":
             create_section_header("SAR Generation")
             # Use the same red_flag_rules list defined at top
-            flagged_transactions = apply_red_flag_rules(transactions, red_flag_rules)
+            flagged_transactions = run_detection(transactions, red_flag_rules, fingerprint=transactions_key)
+            if flagged_transactions is None:
+                st.stop()
             st.write("Flagged Transactions")
             flat_flagged_transactions = pd.concat(flagged_transactions.values()).drop_duplicates()
-            st.dataframe(flat_flagged_transactions)
+            render_data_grid(
+                flat_flagged_transactions,
+                key="flat_flagged",
+                rule_names=list(flagged_transactions),
+                flagged_transactions=flagged_transactions,
+                fingerprint=f"{detection_key(transactions_key, red_flag_rules)}:flat"
+            )
+
+            # Typed ids rather than a multiselect, which would send every flagged id to the browser
+            selected_flags = st.text_input(
+                "Transaction IDs to Include in SAR",
+                help="Comma- or space-separated transaction IDs from the table above"
+            ).replace(',', ' ').split()
 
-            selected_flags = st.multiselect("Select Transactions to Include in SAR", options=flat_flagged_transactions['transaction_id'], format_func=lambda x: f"Transaction ID: {x}")
-            
             if selected_flags:
-                selected_transactions = flat_flagged_transactions[flat_flagged_transactions['transaction_id'].isin(selected_flags)]
+                flagged_ids = flat_flagged_transactions['transaction_id'].astype(str)
+                matched = flagged_ids.isin(selected_flags).to_numpy()
+                unknown = sorted(set(selected_flags) - set(flagged_ids[matched]))
+                if unknown:
+                    st.warning(f"Not among the flagged transactions: {', '.join(unknown)}")
+                selected_transactions = flat_flagged_transactions[matched]
+            else:
+                selected_transactions = flat_flagged_transactions.iloc[:0]
+
+            if not selected_transactions.empty:
                 st.write("Selected Transactions for SAR")
                 st.dataframe(selected_transactions)
                 
@@ -358,15 +613,28 @@ if uploaded_file is not None:
                 violations = [rule for rule in flagged_transactions if customer_id in flagged_transactions[rule]['customer_id'].values]
                 
                 if st.button("Generate SAR Narrative"):
-                    sar_narrative = generate_sar_narrative(customer_id, violations, selected_transactions.to_dict('records'))
-                    display_sar_narrative(sar_narrative, customer_id)  # Pass customer ID
+                    generate_and_display_sar(customer_id, violations, selected_transactions.to_dict('records'))
+                display_pending_sar(customer_id, violations, selected_transactions.to_dict('records'))
 
         elif option == "Search Customers with Multiple Violations":
             create_section_header("Customer Violation Analysis")
             
-            flagged_transactions = apply_red_flag_rules(transactions, red_flag_rules)
+            flagged_transactions = run_detection(transactions, red_flag_rules, fingerprint=transactions_key)
+            if flagged_transactions is None:
+                st.stop()
             customers_with_violations = get_customers_with_multiple_violations(flagged_transactions)
 
+            if st.button("Save Results to Case History"):
+                flagged_customers = {c for data in flagged_transactions.values() for c in data['customer_id']}
+                saved = case_store.append(
+                    flagged_transactions,
+                    narratives={c: n for c, n in st.session_state['sar_narratives'].items() if c in flagged_customers}
+                )
+                if saved:
+                    st.success(f"Saved {saved:,} flagged transactions to case history")
+                else:
+                    st.info("These results are already in case history")
+
             # Controls in columns
             col1, col2 = st.columns([1, 1])
             with col1:
@@ -402,16 +670,29 @@ if uploaded_file is not None:
                 paginated_customer_ids = list(filtered_customers.keys())[start_index:end_index]
 
                 st.markdown("### Customers with Multiple Rule Violations")
+                customer_summaries = st.session_state.processor.customer_summaries(transactions, transactions_key)
+                if st.button("Draft SAR Narratives for All Customers on This Page"):
+                    submitted = draft_all_sars({customer: filtered_customers[customer] for customer in paginated_customer_ids})
+                    st.toast(f"Drafting {submitted} SAR narratives in the background")
                 
                 for customer in paginated_customer_ids:
                     rules = filtered_customers[customer]
                     with st.expander(f"🔍 Customer ID: {customer}", expanded=True):
+                        prior_hits = case_store.customer_history(customer, with_narratives=False)
+                        if not prior_hits.empty:
+                            st.caption(
+                                f"{len(prior_hits):,} stored hits in case history, "
+                                f"latest {prior_hits['date'].iloc[0]:%Y-%m-%d}"
+                            )
                         col1, col2 = st.columns([2, 1])
                         
                         with col1:
                             # Customer transaction summary
                             customer_transactions = transactions[transactions['customer_id'] == customer]
-                            metrics = create_summary_metrics(customer_transactions)
+                            metrics = create_summary_metrics(
+                                customer_transactions,
+                                TransactionProcessor.get_customer_summary(customer_summaries, customer)
+                            )
                             metric_cols = st.columns(len(metrics))
                             for mcol, (_, metric) in zip(metric_cols, metrics.items()):
                                 with mcol:
@@ -426,7 +707,8 @@ if uploaded_file is not None:
                                     )
                             
                             st.markdown("#### Transaction Data")
-                            st.dataframe(customer_transactions, height=200)
+                            render_data_grid(customer_transactions, key=f"customer_{customer}", page_size=10,
+                                             fingerprint=f"{transactions_key}:{customer}")
                         
                         with col2:
                             # Violations summary
@@ -463,8 +745,66 @@ if uploaded_file is not None:
                         # SAR Generation
                         if st.button(f"Generate SAR Narrative for Customer {customer}"):
                             generate_and_display_sar(customer, rules)
+                        display_pending_sar(customer, rules)
 
-                        if customer in st.session_state['sar_narratives']:
-                            display_sar_narrative(st.session_state['sar_narratives'][customer], customer)  # Pass customer ID
+                st.markdown("### Export SAR Drafts")
+                export_sar_drafts(flagged_transactions, customers_with_violations)
             else:
-                st.warning("No customers found with the specified number of violations.")
\ No newline at end of file
+                st.warning("No customers found with the specified number of violations.")
+
+        elif option == "Threshold Backtesting":
+            create_section_header("Threshold Backtesting")
+            st.caption("What-if view of alert volume at other thresholds. Production rules are not changed.")
+
+            col1, col2 = st.columns([2, 1])
+            with col1:
+                sweep_rule = st.selectbox(
+                    "Rule to tune",
+                    list(THRESHOLD_SWEEPS),
+                    format_func=lambda rule: rule.replace('_', ' ').title()
+                )
+            with col2:
+                sweep_points = st.slider("Threshold settings", min_value=10, max_value=500, value=DEFAULT_POINTS)
+            # e.g. the 10,000 ceiling of the structuring band; the other bounds stay at production values
+            sweep_parameter = st.radio(
+                "Bound to sweep", sweep_parameters(sweep_rule), horizontal=True,
+                format_func=lambda parameter: parameter.title()
+            )
+
+            job_id = job_queue.submit(
+                'backtest', backtest_job, transactions, sweep_rule, sweep_points, parameter=sweep_parameter,
+                profile_store=profile_store,
+                job_key=make_job_key('backtest', transactions_key, sweep_rule, sweep_points, sweep_parameter,
+                                     reference_data_signature()),
+                params={'rule': sweep_rule, 'points': sweep_points, 'parameter': sweep_parameter}
+            )
+            sweep = fetch_job_result(job_id, "Sweeping thresholds")
+            if sweep is None:
+                st.stop()
+
+            current = sweep[sweep['current']].iloc[0]
+            col1, col2, col3 = st.columns(3)
+            with col1:
+                st.markdown(create_metric_card(f"Current {sweep_parameter.title()}", f"{current_threshold(sweep_rule, sweep_parameter):,}"), unsafe_allow_html=True)
+            with col2:
+                st.markdown(create_metric_card("Alerts at Current", f"{current['alerts']:,}"), unsafe_allow_html=True)
+            with col3:
+                st.markdown(create_metric_card("Customers at Current", f"{current['customers']:,}"), unsafe_allow_html=True)
+
+            st.plotly_chart(
+                create_threshold_sweep_chart(sweep, sweep_rule, sweep_parameter),
+                use_container_width=True,
+                config=VisualizationTheme.INTERACTION_CONFIG
+            )
+            st.markdown("#### Alerts per Threshold")
+            st.caption("overlap columns count this rule's alerts that the other rules also flag at their current thresholds")
+            st.dataframe(sweep, hide_index=True, use_container_width=True)
+
+if show_performance:
+    with st.sidebar:
+        st.header("Performance")
+        if profiler.spans:
+            st.dataframe(pd.DataFrame(profiler.to_records()), hide_index=True)
+            st.download_button("Download metrics (JSON)", profiler.to_json(), file_name="sargen_metrics.json")
+        else:
+            st.caption("No timed operations in this run.")
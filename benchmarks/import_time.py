@@ -0,0 +1,121 @@
+"""Startup benchmark: import time of the core modules, measured with `python -X importtime`.
+
+Usage:
+    python -m benchmarks.import_time
+    python -m benchmarks.import_time --repeat 5 --budget-ms 800 --compare benchmarks/results/previous.json
+
+Each module is imported in a fresh interpreter. The check fails (exit code 1) if a
+core module pulls in a UI or LLM package, or if --budget-ms is given and exceeded.
+"""
+import argparse
+import json
+import os
+import platform
+import re
+import subprocess
+import sys
+import time
+
+from benchmarks.run_benchmarks import RESULTS_DIR, _git_revision
+
+CORE_MODULES = [
+    'red_flag_rules',
+    'modules.data_processing',
+    'modules.baselines',
+    'modules.countries',
+    'modules.text_fingerprints',
+    'modules.ingestion',
+    'modules.jobs',
+    'modules.case_store',
+    'modules.sar_export',
+    'modules.prompt_templates',
+    'modules.profiling',
+    'modules.visualization',
+    'sar_groq',
+    'sar_local',
+    'sar_generator',
+]
+# Packages the core modules must only import on first use
+DEFERRED_PACKAGES = ['streamlit', 'plotly', 'groq', 'openai', 'tiktoken']
+
+_LINE = re.compile(r"import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)")
+
+
+def measure_import(module):
+    """Imports module in a fresh interpreter; returns {package: (self_us, cumulative_us)}"""
+    completed = subprocess.run([sys.executable, '-X', 'importtime', '-c', f"import {module}"],
+                               capture_output=True, text=True)
+    if completed.returncode != 0:
+        raise RuntimeError(f"Importing {module} failed:\n{completed.stderr[-2000:]}")
+    timings = {}
+    for line in completed.stderr.splitlines():
+        match = _LINE.match(line)
+        if match:
+            timings[match.group(4)] = (int(match.group(1)), int(match.group(2)))
+    return timings
+
+
+def run_import_benchmark(modules=CORE_MODULES, repeat=3, top=5):
+    """Best-of-`repeat` cumulative import time per module, with its slowest imports"""
+    results = {}
+    for module in modules:
+        runs = [measure_import(module) for _ in range(repeat)]
+        best = min(runs, key=lambda timings: timings[module][1])
+        slowest = sorted(best.items(), key=lambda item: item[1][0], reverse=True)[:top]
+        results[module] = {
+            'milliseconds': best[module][1] / 1000,
+            'slowest_imports': {name: self_us / 1000 for name, (self_us, _) in slowest},
+            'deferred_loaded': sorted({name.split('.')[0] for name in best} & set(DEFERRED_PACKAGES)),
+        }
+    return results
+
+
+def compare(current, baseline):
+    for module, result in current.items():
+        previous = baseline.get(module, {}).get('milliseconds')
+        ratio = f"{result['milliseconds'] / previous:6.2f}x" if previous else "    new"
+        loaded = f"  loads {', '.join(result['deferred_loaded'])}" if result['deferred_loaded'] else ""
+        print(f"{module:30s} {result['milliseconds']:9.1f}ms {ratio}{loaded}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark import time of SaRGeN core modules")
+    parser.add_argument('modules', nargs='*', default=CORE_MODULES)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--budget-ms', type=float, help="Fail if any module takes longer to import")
+    parser.add_argument('--output', help="Results JSON path (default: benchmarks/results/importtime_<timestamp>.json)")
+    parser.add_argument('--compare', help="Previous results JSON to compare against")
+    args = parser.parse_args()
+
+    modules = run_import_benchmark(args.modules, repeat=args.repeat)
+    results = {
+        'revision': _git_revision(),
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'params': vars(args),
+        'modules': modules,
+    }
+    output = args.output or os.path.join(RESULTS_DIR, f"importtime_{time.strftime('%Y%m%d_%H%M%S')}.json")
+    os.makedirs(os.path.dirname(output) or '.', exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(results, f, indent=2)
+
+    baseline = {}
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)['modules']
+    compare(modules, baseline)
+    print(f"Results written to {output}")
+
+    failures = [f"{module} imports {', '.join(result['deferred_loaded'])} at import time"
+                for module, result in modules.items() if result['deferred_loaded']]
+    if args.budget_ms is not None:
+        failures += [f"{module} takes {result['milliseconds']:.1f}ms (budget {args.budget_ms:.0f}ms)"
+                     for module, result in modules.items() if result['milliseconds'] > args.budget_ms]
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,131 @@
+"""Benchmark harness for loading, detection, aggregation and prompt building.
+
+Usage:
+    python -m benchmarks.run_benchmarks --rows 1000000 --customers 100000
+    python -m benchmarks.run_benchmarks --data transactions.csv --compare benchmarks/results/previous.json
+
+Results are written as JSON so runs can be compared across versions. Everything is
+loaded into memory, so very large row counts need a machine sized accordingly.
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import tempfile
+import time
+
+import pandas as pd
+
+from benchmarks.synthetic_data import write_transactions_csv
+from modules.backtesting import sweep_thresholds
+from modules.profiling import Profiler, activate, span
+from modules.visualization import create_summary_metrics, create_preview_dashboard
+from red_flag_rules import RULES, apply_red_flag_rules, get_customers_with_multiple_violations
+import sar_groq
+
+RESULTS_DIR = os.path.join('benchmarks', 'results')
+
+
+def _git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except Exception:
+        return None
+
+
+def run_benchmark(data_path, rules=None, prompt_customers=20, repeat=1, track_memory=False):
+    """Runs every stage `repeat` times and returns the recorded spans"""
+    rules = rules or list(RULES)
+    # tracemalloc slows allocation-heavy code, so peak memory is opt-in
+    profiler = activate(Profiler(track_memory=track_memory))
+    for _ in range(repeat):
+        with span('load_data') as record:
+            transactions = pd.read_csv(data_path)
+            record['rows'] = len(transactions)
+
+        flagged_transactions = apply_red_flag_rules(transactions, rules)
+        customers = get_customers_with_multiple_violations(flagged_transactions)
+
+        with span('threshold_sweep', rows=len(transactions)):
+            sweep_thresholds(transactions)
+
+        with span('dashboard', rows=len(transactions)):
+            create_summary_metrics(transactions)
+            create_preview_dashboard(transactions)
+
+        with span('prompt_building', rows=prompt_customers):
+            for customer in list(customers)[:prompt_customers]:
+                customer_transactions = transactions[transactions['customer_id'] == customer]
+                sar_groq.build_sar_prompt(customer, sorted(customers[customer]),
+                                          customer_transactions.to_dict('records'))
+    return profiler.to_records()
+
+
+def summarize(spans):
+    """Median seconds per span name"""
+    frame = pd.DataFrame(spans)
+    return frame.groupby('name', sort=False)['seconds'].median().to_dict()
+
+
+def compare(current, baseline):
+    for name, seconds in current.items():
+        previous = baseline.get(name)
+        ratio = f"{seconds / previous:6.2f}x" if previous else "    new"
+        print(f"{name:45s} {seconds:10.4f}s {ratio}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark SaRGeN detection paths")
+    parser.add_argument('--data', help="Existing CSV to benchmark instead of generating one")
+    parser.add_argument('--rows', type=int, default=1000000)
+    parser.add_argument('--customers', type=int, default=10000)
+    parser.add_argument('--high-risk-rate', type=float, default=0.1)
+    parser.add_argument('--keyword-rate', type=float, default=0.05)
+    parser.add_argument('--multiline-rate', type=float, default=0.3)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--repeat', type=int, default=1)
+    parser.add_argument('--memory', action='store_true', help="Record peak memory per stage (slower)")
+    parser.add_argument('--output', help="Results JSON path (default: benchmarks/results/<timestamp>.json)")
+    parser.add_argument('--compare', help="Previous results JSON to compare against")
+    args = parser.parse_args()
+
+    params = vars(args).copy()
+    with tempfile.TemporaryDirectory() as tmp:
+        data_path = args.data
+        if data_path is None:
+            data_path = os.path.join(tmp, 'synthetic.csv')
+            started = time.perf_counter()
+            write_transactions_csv(data_path, args.rows, n_customers=args.customers,
+                                   high_risk_rate=args.high_risk_rate, keyword_rate=args.keyword_rate,
+                                   multiline_rate=args.multiline_rate, seed=args.seed)
+            params['generation_seconds'] = time.perf_counter() - started
+        spans = run_benchmark(data_path, repeat=args.repeat, track_memory=args.memory)
+
+    results = {
+        'revision': _git_revision(),
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'pandas': pd.__version__,
+        'params': params,
+        'prompt_template': {'key': sar_groq.PROMPT_TEMPLATE.key,
+                            'static_tokens': sar_groq.PROMPT_TEMPLATE.static_tokens},
+        'summary': summarize(spans),
+        'spans': spans,
+    }
+    output = args.output or os.path.join(RESULTS_DIR, f"benchmark_{time.strftime('%Y%m%d_%H%M%S')}.json")
+    os.makedirs(os.path.dirname(output) or '.', exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(results, f, indent=2, default=str)
+
+    if args.compare:
+        with open(args.compare) as f:
+            compare(results['summary'], json.load(f)['summary'])
+    else:
+        compare(results['summary'], {})
+    print(f"Results written to {output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,138 @@
+"""Synthetic transaction generator matching the DummyData schema.
+
+Usage:
+    python -m benchmarks.synthetic_data --rows 1000000 --customers 100000 --output synthetic.csv.gz
+"""
+import argparse
+import gzip
+import re
+
+import numpy as np
+import pandas as pd
+
+COLUMNS = ['transaction_id', 'customer_id', 'account_id', 'amount', 'transaction_type',
+           'country', 'date', 'velocity', 'account_balance', 'description']
+TRANSACTION_TYPES = ['refund', 'loan', 'payment', 'salary', 'purchase', 'deposit', 'transfer', 'withdrawal']
+# Not on the high-risk list, so they never trigger the country rules
+LOW_RISK_COUNTRIES = ['USA', 'Norway', 'Sweden', 'Denmark', 'Finland', 'New Zealand',
+                      'Iceland', 'Estonia', 'Slovenia', 'Croatia']
+FILLER_WORDS = ['account', 'payment', 'invoice', 'monthly', 'rent', 'office', 'payroll', 'insurance',
+                'maintenance', 'tuition', 'refund', 'loan', 'repayment', 'order', 'shipment',
+                'equipment', 'license', 'transfer', 'services', 'supplies', 'utilities', 'vendor']
+
+
+def _customer_ids(n_customers, rng):
+    raw = rng.integers(0, 2 ** 63, size=(n_customers, 2), dtype=np.int64).view(np.uint64)
+    return np.array([f"{a:016x}{b:016x}" for a, b in raw], dtype=object)
+
+
+def _format_uuid(hex_ids):
+    return np.array([f"{h[:8]}-{h[8:12]}-{h[12:16]}-{h[16:20]}-{h[20:32]}" for h in hex_ids], dtype=object)
+
+
+class SyntheticTransactionGenerator:
+    """Generates transactions chunk by chunk with controllable rule hit rates"""
+
+    def __init__(self, n_customers=10000, high_risk_rate=0.1, keyword_rate=0.05, multiline_rate=0.3,
+                 structuring_rate=0.02, start='2023-01-01', days=365, seed=0):
+        self.rng = np.random.default_rng(seed)
+        self.customers = _format_uuid(_customer_ids(n_customers, self.rng))
+        self.accounts = self.rng.integers(1000, 2000, size=n_customers)
+        self.high_risk_rate = high_risk_rate
+        self.keyword_rate = keyword_rate
+        self.multiline_rate = multiline_rate
+        self.structuring_rate = structuring_rate
+        self.start = pd.Timestamp(start)
+        self.seconds = days * 86400
+
+        self.high_risk_countries = pd.read_csv('data/high_risk_countries.csv')['Name'].tolist()
+        self.keywords = pd.read_csv('data/high_risk_keywords.csv')['Keyword'].dropna().astype(str).tolist()
+        # Keep only filler words that no keyword matches, so keyword hits come from keyword_rate alone
+        pattern = re.compile('|'.join(self.keywords), re.IGNORECASE)
+        self.filler = np.array([w for w in FILLER_WORDS if not pattern.search(w)], dtype=object)
+        self.next_id = 1
+
+    def _descriptions(self, n):
+        rng = self.rng
+        words = self.filler[rng.integers(0, len(self.filler), size=(n, 6))]
+        first = [' '.join(row[:3]).capitalize() + '.' for row in words]
+        second = [' '.join(row[3:]).capitalize() + '.' for row in words]
+        multiline = rng.random(n) < self.multiline_rate
+        text = np.where(multiline, np.char.add(np.char.add(first, '\n'), second).astype(object),
+                        np.array(first, dtype=object))
+        hits = np.flatnonzero(rng.random(n) < self.keyword_rate)
+        chosen = np.array(self.keywords, dtype=object)[rng.integers(0, len(self.keywords), size=len(hits))]
+        text[hits] = text[hits] + ' Ref ' + chosen + '.'
+        return text
+
+    def chunk(self, n):
+        rng = self.rng
+        customer_idx = rng.integers(0, len(self.customers), size=n)
+        amounts = rng.lognormal(mean=8.3, sigma=0.9, size=n)
+        structuring = rng.random(n) < self.structuring_rate
+        amounts[structuring] = rng.uniform(9000, 10000, size=structuring.sum())
+        high_risk = rng.random(n) < self.high_risk_rate
+        countries = np.where(
+            high_risk,
+            np.array(self.high_risk_countries, dtype=object)[rng.integers(0, len(self.high_risk_countries), size=n)],
+            np.array(LOW_RISK_COUNTRIES, dtype=object)[rng.integers(0, len(LOW_RISK_COUNTRIES), size=n)],
+        )
+        dates = self.start + pd.to_timedelta(np.sort(rng.integers(0, self.seconds, size=n)), unit='s')
+
+        data = pd.DataFrame({
+            'transaction_id': np.arange(self.next_id, self.next_id + n),
+            'customer_id': self.customers[customer_idx],
+            'account_id': self.accounts[customer_idx],
+            'amount': amounts,
+            'transaction_type': np.array(TRANSACTION_TYPES, dtype=object)[rng.integers(0, len(TRANSACTION_TYPES), size=n)],
+            'country': countries,
+            'date': dates.strftime('%Y-%m-%d %H:%M:%S'),
+            'velocity': rng.integers(1, 11, size=n),
+            'account_balance': rng.uniform(0, 100000, size=n),
+            'description': self._descriptions(n),
+        }, columns=COLUMNS)
+        self.next_id += n
+        return data
+
+    def generate(self, n_rows, chunk_size=1000000):
+        """Yields DataFrame chunks adding up to n_rows"""
+        remaining = n_rows
+        while remaining > 0:
+            n = min(chunk_size, remaining)
+            yield self.chunk(n)
+            remaining -= n
+
+
+def generate_transactions(n_rows, **kwargs):
+    """Returns n_rows synthetic transactions as one DataFrame"""
+    return pd.concat(SyntheticTransactionGenerator(**kwargs).generate(n_rows), ignore_index=True)
+
+
+def write_transactions_csv(file_path, n_rows, chunk_size=1000000, **kwargs):
+    """Streams n_rows synthetic transactions to CSV (gzip when the path ends in .gz) with bounded memory"""
+    opener = gzip.open if str(file_path).endswith('.gz') else open
+    with opener(file_path, 'wt', newline='') as f:
+        for i, data in enumerate(SyntheticTransactionGenerator(**kwargs).generate(n_rows, chunk_size)):
+            data.to_csv(f, header=(i == 0), index=False)
+    return file_path
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate synthetic transactions")
+    parser.add_argument('--rows', type=int, default=1000000)
+    parser.add_argument('--customers', type=int, default=10000)
+    parser.add_argument('--high-risk-rate', type=float, default=0.1)
+    parser.add_argument('--keyword-rate', type=float, default=0.05)
+    parser.add_argument('--multiline-rate', type=float, default=0.3)
+    parser.add_argument('--chunk-size', type=int, default=1000000)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', default='synthetic_transactions.csv')
+    args = parser.parse_args()
+    write_transactions_csv(args.output, args.rows, chunk_size=args.chunk_size, n_customers=args.customers,
+                           high_risk_rate=args.high_risk_rate, keyword_rate=args.keyword_rate,
+                           multiline_rate=args.multiline_rate, seed=args.seed)
+    print(f"Wrote {args.rows:,} rows to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,130 @@
+import asyncio
+import logging
+import threading
+import time
+
+from modules.jobs import QUEUED, RUNNING, DONE, FAILED, PURGE_INTERVAL_SECONDS
+
+# Finished drafts are kept in memory this long for sessions to pick up
+DRAFT_RETENTION_SECONDS = 24 * 3600
+
+
+class AsyncDraftRunner:
+    """Drafts SAR narratives concurrently on one background asyncio loop.
+
+    submit() and submit_many() only schedule the calls and return at once; callers poll
+    status() for each draft. Drafts are keyed by the prompt cache key, so the same
+    customer and inputs are never drafted twice at the same time, and a failed draft can
+    be retried. With generate_batch_async, submit_many() sends customers batch_size at a
+    time as one call, for backends that draft several prompts together. A finished draft
+    drops its request (failed ones keep it for retry) and is forgotten `retention`
+    seconds after it finished.
+    """
+
+    def __init__(self, generate_async, max_concurrency=4, generate_batch_async=None, batch_size=1,
+                 retention=DRAFT_RETENTION_SECONDS):
+        self._generate = generate_async
+        self._generate_batch = generate_batch_async
+        self._batch_size = batch_size if generate_batch_async else 1
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self.retention = retention
+        self._last_purge = time.time()
+        self._lock = threading.Lock()
+        self._drafts = {}
+        self._loop = asyncio.new_event_loop()
+        threading.Thread(target=self._loop.run_forever, name='sar-drafts', daemon=True).start()
+
+    def _queue(self, key, customer_id, rules, records):
+        if time.time() - self._last_purge > PURGE_INTERVAL_SECONDS:
+            self.purge()
+        with self._lock:
+            draft = self._drafts.get(key)
+            if draft is not None and draft['status'] != FAILED:
+                return False
+            self._drafts[key] = {'status': QUEUED, 'customer_id': customer_id, 'narrative': None,
+                                 'error': None, 'finished_at': None,
+                                 'request': (customer_id, list(rules), records)}
+        return True
+
+    def purge(self, older_than=None):
+        """Forgets drafts that finished more than `older_than` seconds ago (default: retention)"""
+        self._last_purge = time.time()
+        cutoff = self._last_purge - (self.retention if older_than is None else older_than)
+        with self._lock:
+            expired = [key for key, draft in self._drafts.items()
+                       if draft['finished_at'] is not None and draft['finished_at'] < cutoff]
+            for key in expired:
+                del self._drafts[key]
+        return len(expired)
+
+    def submit(self, key, customer_id, rules, records):
+        """Schedules a draft unless one for key is already queued, running or done"""
+        if not self._queue(key, customer_id, rules, records):
+            return False
+        asyncio.run_coroutine_threadsafe(self._draft(key), self._loop)
+        return True
+
+    def submit_many(self, drafts):
+        """Schedules (key, customer_id, rules, records) drafts, batch_size per call; returns how many were queued"""
+        keys = [draft[0] for draft in drafts if self._queue(*draft)]
+        if self._batch_size == 1:
+            for key in keys:
+                asyncio.run_coroutine_threadsafe(self._draft(key), self._loop)
+        else:
+            for i in range(0, len(keys), self._batch_size):
+                asyncio.run_coroutine_threadsafe(self._draft_batch(keys[i:i + self._batch_size]), self._loop)
+        return len(keys)
+
+    def retry(self, key):
+        with self._lock:
+            draft = self._drafts.get(key)
+        if draft is None or draft['status'] != FAILED:
+            return False
+        return self.submit(key, *draft['request'])
+
+    def status(self, key):
+        """The draft's status, narrative and error, or None if it was never submitted"""
+        with self._lock:
+            draft = self._drafts.get(key)
+            return None if draft is None else {k: v for k, v in draft.items() if k != 'request'}
+
+    def _set(self, key, **fields):
+        with self._lock:
+            self._drafts[key].update(fields)
+
+    def _finish(self, key, narrative=None, error=None):
+        with self._lock:
+            draft = self._drafts[key]
+            draft.update(status=FAILED if error else DONE, narrative=narrative, error=error,
+                         finished_at=time.time())
+            if not error:
+                draft['request'] = None  # only a failed draft is sent again
+
+    async def _draft(self, key):
+        with self._lock:
+            customer_id, rules, records = self._drafts[key]['request']
+        async with self._semaphore:
+            self._set(key, status=RUNNING)
+            try:
+                narrative = await self._generate(customer_id, rules, records)
+            except Exception as e:
+                logging.error(f"SAR draft for customer {customer_id} failed: {e}")
+                self._finish(key, error=str(e))
+            else:
+                self._finish(key, narrative=narrative)
+
+    async def _draft_batch(self, keys):
+        with self._lock:
+            requests = [self._drafts[key]['request'] for key in keys]
+        async with self._semaphore:
+            for key in keys:
+                self._set(key, status=RUNNING)
+            try:
+                narratives = await self._generate_batch(requests)
+            except Exception as e:
+                logging.error(f"SAR draft batch of {len(keys)} customers failed: {e}")
+                for key in keys:
+                    self._finish(key, error=str(e))
+            else:
+                for key, narrative in zip(keys, narratives):
+                    self._finish(key, narrative=narrative)
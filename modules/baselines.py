@@ -0,0 +1,278 @@
+import os
+import shutil
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+# Robust z-scores use the MAD scaled to be consistent with the standard deviation
+MAD_SCALE = 0.6745
+# Customers with fewer transactions than this have no usable baseline
+MIN_HISTORY = 5
+# A type or country is "typical" for a customer above this share of their activity
+TYPICAL_SHARE = 0.1
+
+TYPE_PREFIX = 'type:'
+COUNTRY_PREFIX = 'country:'
+STAT_COLUMNS = ['n', 'amount_sum', 'amount_sumsq', 'amount_median', 'amount_mad']
+
+
+def category_counts(transactions):
+    """Type and country counts per customer in long form, indexed by (customer_id, category).
+
+    Categories carry their prefix (`type:wire`, `country:US`); only non-zero counts appear.
+    """
+    parts = []
+    for column, prefix in (('transaction_type', TYPE_PREFIX), ('country', COUNTRY_PREFIX)):
+        counts = transactions.groupby(['customer_id', column], observed=True).size()
+        counts.index = counts.index.set_levels(prefix + counts.index.levels[1].astype(str), level=1)
+        parts.append(counts)
+    counts = pd.concat(parts).astype('int64')
+    counts.index.names = ['customer_id', 'category']
+    return counts
+
+
+def compute_customer_stats(transactions):
+    """Per-customer amount statistics (STAT_COLUMNS) in one grouped pass"""
+    amounts = transactions['amount'].astype('float64')
+    grouped = amounts.groupby(transactions['customer_id'])
+    medians = grouped.transform('median')
+    stats = pd.DataFrame({
+        'n': grouped.size(),
+        'amount_sum': grouped.sum(),
+        'amount_sumsq': (amounts * amounts).groupby(transactions['customer_id']).sum(),
+        'amount_median': grouped.median(),
+        'amount_mad': (amounts - medians).abs().groupby(transactions['customer_id']).median(),
+    })
+    stats.index.name = 'customer_id'
+    return stats
+
+
+def compute_customer_profiles(transactions):
+    """Computes per-customer amount statistics and type/country counts in one grouped pass"""
+    counts = category_counts(transactions).unstack(fill_value=0)
+    profiles = pd.concat([compute_customer_stats(transactions), counts.astype('int64')], axis=1)
+    profiles.index.name = 'customer_id'
+    return profiles
+
+
+def merge_customer_stats(stats, new_stats):
+    """Merges two stat tables. Counts, sums and sums of squares merge exactly. Median and
+    MAD cannot be merged exactly from summaries, so they are blended weighted by count.
+    """
+    index = stats.index.union(new_stats.index)
+    old = stats.reindex(index)
+    new = new_stats.reindex(index)
+    old_n = old['n'].fillna(0)
+    new_n = new['n'].fillna(0)
+    total = old_n + new_n
+
+    merged = pd.DataFrame(index=index)
+    merged['n'] = total.astype('int64')
+    merged['amount_sum'] = old['amount_sum'].fillna(0) + new['amount_sum'].fillna(0)
+    merged['amount_sumsq'] = old['amount_sumsq'].fillna(0) + new['amount_sumsq'].fillna(0)
+    for column in ['amount_median', 'amount_mad']:
+        merged[column] = (old[column].fillna(0) * old_n + new[column].fillna(0) * new_n) / total
+    merged.index.name = 'customer_id'
+    return merged
+
+
+def update_customer_profiles(profiles, new_transactions):
+    """Folds a new batch of transactions into existing profiles without revisiting history
+    (see merge_customer_stats for how the statistics combine)
+    """
+    batch = compute_customer_profiles(new_transactions)
+    if profiles is None or profiles.empty:
+        return batch
+
+    merged = merge_customer_stats(profiles[STAT_COLUMNS], batch[STAT_COLUMNS])
+    old = profiles.reindex(merged.index)
+    new = batch.reindex(merged.index)
+    count_columns = [c for c in old.columns.union(new.columns) if c not in STAT_COLUMNS]
+    counts = old.reindex(columns=count_columns).fillna(0) + new.reindex(columns=count_columns).fillna(0)
+    merged = pd.concat([merged, counts.astype('int64')], axis=1)
+    merged.index.name = 'customer_id'
+    return merged
+
+
+def save_customer_profiles(profiles, file_path):
+    """Persists profiles as CSV (gzip-compressed when the path ends in .gz)"""
+    profiles.to_csv(file_path)
+
+
+def load_customer_profiles(file_path):
+    try:
+        return pd.read_csv(file_path, index_col='customer_id')
+    except FileNotFoundError:
+        return None
+
+
+def row_keys(transactions):
+    """A uint64 key per transaction from its id, customer, date and amount.
+
+    Unlike the bare transaction_id, it tells apart rows from different files that reuse
+    the same ids, while the same row loaded twice (with any column dtypes) gets one key.
+    """
+    return pd.util.hash_pandas_object(pd.DataFrame({
+        'transaction_id': transactions['transaction_id'].astype('int64').to_numpy(),
+        'customer_id': transactions['customer_id'].astype(str).to_numpy(dtype=object),
+        'date': pd.to_datetime(transactions['date']).to_numpy(dtype='datetime64[ns]'),
+        'amount': transactions['amount'].astype('float64').to_numpy(),
+    }), index=False).to_numpy()
+
+
+PROFILES_DIR = 'data/profiles'
+# Folded parts kept before they are compacted into a new snapshot
+COMPACT_PARTS = 32
+
+
+def _save_column(path, values):
+    values = np.asarray(values)
+    # Text ids are stored as fixed-width unicode, so files load without pickle
+    np.save(path, values.astype(str) if values.dtype == object else values)
+
+
+class ProfileStore:
+    """Customer profiles persisted across runs and updated incrementally.
+
+    Layout under `root`, one directory per write, each holding a .npy file per column:
+      base-<ns>/   a snapshot: the stat table (customer_id + STAT_COLUMNS), long-form
+                   category counts (count_customer_id, count_category, count) and the
+                   row keys of every transaction folded in
+      part-<ns>/   one fold, the same files for just that batch's transactions
+
+    Loading replays the parts newer than the latest snapshot. A fold writes only its
+    batch; every COMPACT_PARTS folds the parts are merged into a new snapshot. Only
+    transactions whose row key (see row_keys) is new are folded, so re-scoring a batch,
+    a customer-filtered run or overlapping extracts never count the same history twice.
+    """
+
+    def __init__(self, root=PROFILES_DIR, compact_parts=COMPACT_PARTS):
+        self.root = root
+        self.compact_parts = compact_parts
+        os.makedirs(root, exist_ok=True)
+        self._lock = threading.Lock()
+        self._stats = pd.DataFrame(columns=STAT_COLUMNS)
+        self._counts = pd.Series(dtype='int64', index=pd.MultiIndex.from_arrays(
+            [[], []], names=['customer_id', 'category']))
+        self._new_counts = []  # folded since the last merge; only profiles() and compaction need counts
+        self._seen = np.array([], dtype=np.uint64)  # sorted row keys
+        self._parts = []
+
+        names = sorted(d for d in os.listdir(root) if not d.startswith('.'))
+        bases = [name for name in names if name.startswith('base-')]
+        base = bases[-1] if bases else None
+        if base:
+            self._fold(*self._read(base))
+        for name in names:
+            if name.startswith('part-') and (base is None or name[5:] > base[5:]):
+                self._fold(*self._read(name))
+                self._parts.append(name)
+
+    def profiles_for(self, transactions):
+        """Stat table for scoring a batch: stored history with the batch's new transactions folded in and saved"""
+        with self._lock:
+            keys = row_keys(transactions)
+            # Binary search of the sorted keys; np.isin would hash all of them on every run
+            positions = np.searchsorted(self._seen, keys)
+            new = positions == len(self._seen)
+            new[~new] = self._seen[positions[~new]] != keys[~new]
+            if new.any():
+                batch = transactions[new]
+                stats, counts = compute_customer_stats(batch), category_counts(batch)
+                keys = np.unique(keys[new])
+                self._fold(stats, counts, keys)
+                self._parts.append(self._write('part', stats, counts, keys))
+                if len(self._parts) >= self.compact_parts:
+                    self._compact()
+            return self._stats
+
+    def profiles(self):
+        """Every stored profile as one wide table, like compute_customer_profiles"""
+        with self._lock:
+            counts = self._category_counts().unstack(fill_value=0)
+            return pd.concat([self._stats, counts], axis=1).fillna(0).astype({c: 'int64' for c in counts})
+
+    def _category_counts(self):
+        if self._new_counts:
+            counts = pd.concat([self._counts, *self._new_counts])
+            self._counts = counts.groupby(level=['customer_id', 'category'], sort=False).sum()
+            self._new_counts = []
+        return self._counts
+
+    def _fold(self, stats, counts, keys):
+        """keys: sorted, and none of them folded before"""
+        self._stats = merge_customer_stats(self._stats, stats) if len(self._stats) else stats
+        self._new_counts.append(counts)
+        self._seen = np.insert(self._seen, np.searchsorted(self._seen, keys), keys)
+
+    def _write(self, kind, stats, counts, keys):
+        name = f"{kind}-{time.time_ns():020d}"
+        tmp_dir = os.path.join(self.root, f".{name}.tmp")
+        os.makedirs(tmp_dir)
+        _save_column(os.path.join(tmp_dir, 'customer_id.npy'), stats.index)
+        for column in STAT_COLUMNS:
+            np.save(os.path.join(tmp_dir, f"{column}.npy"), stats[column].to_numpy())
+        _save_column(os.path.join(tmp_dir, 'count_customer_id.npy'), counts.index.get_level_values(0))
+        _save_column(os.path.join(tmp_dir, 'count_category.npy'), counts.index.get_level_values(1))
+        np.save(os.path.join(tmp_dir, 'count.npy'), counts.to_numpy())
+        np.save(os.path.join(tmp_dir, 'row_keys.npy'), keys)
+        # Visible to loaders only once complete
+        os.rename(tmp_dir, os.path.join(self.root, name))
+        return name
+
+    def _read(self, name):
+        def load(column):
+            return np.load(os.path.join(self.root, name, f"{column}.npy"))
+
+        stats = pd.DataFrame({column: load(column) for column in STAT_COLUMNS},
+                             index=pd.Index(load('customer_id'), name='customer_id'))
+        counts = pd.Series(load('count'), index=pd.MultiIndex.from_arrays(
+            [load('count_customer_id'), load('count_category')], names=['customer_id', 'category']))
+        return stats, counts, load('row_keys')
+
+    def _compact(self):
+        """Replaces the latest snapshot and the parts since with one new snapshot"""
+        stale = [name for name in os.listdir(self.root) if name.startswith(('base-', 'part-'))]
+        self._write('base', self._stats, self._category_counts(), self._seen)
+        for name in stale:
+            shutil.rmtree(os.path.join(self.root, name), ignore_errors=True)
+        self._parts = []
+
+
+def typical_categories(profiles, prefix=TYPE_PREFIX, share=TYPICAL_SHARE):
+    """Returns, per customer, the types or countries making up at least `share` of activity"""
+    counts = profiles[[c for c in profiles.columns if c.startswith(prefix)]]
+    shares = counts.div(profiles['n'], axis=0)
+    labels = np.array([c[len(prefix):] for c in counts.columns], dtype=object)
+    mask = shares.to_numpy() >= share
+    return pd.Series([list(labels[row]) for row in mask], index=profiles.index)
+
+
+def amount_deviation_scores(transactions, profiles):
+    """Robust z-score of each transaction amount against its customer's baseline.
+
+    Falls back to a classic z-score where the MAD is zero, and scores customers
+    with too little history as 0.
+    """
+    # Look each customer up once and gather every statistic through the same positions
+    positions = profiles.index.get_indexer(transactions['customer_id'])
+    known = positions >= 0
+
+    def gather(values):
+        values = np.asarray(values, dtype='float64')
+        return pd.Series(np.where(known, values[positions], np.nan), index=transactions.index)
+
+    n = gather(profiles['n']).fillna(0)
+    median = gather(profiles['amount_median'])
+    mad = gather(profiles['amount_mad'])
+    mean = gather(profiles['amount_sum'] / profiles['n'])
+    variance = gather(profiles['amount_sumsq'] / profiles['n']) - mean ** 2
+    std = np.sqrt(variance.clip(lower=0))
+
+    amounts = transactions['amount']
+    robust = MAD_SCALE * (amounts - median) / mad.where(mad > 0)
+    classic = (amounts - mean) / std.where(std > 0)
+    scores = robust.fillna(classic).abs().fillna(0)
+    return scores.where(n >= MIN_HISTORY, 0)
@@ -0,0 +1,226 @@
+import json
+import os
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+CASE_STORE_DIR = 'data/case_store'
+
+# Columns of every partition, one .npy file each
+COLUMNS = {
+    'transaction_id': np.int64,
+    'customer_code': np.int64,
+    'date': 'datetime64[s]',
+    'rule_mask': np.uint64,
+    'customer_score': np.float32,
+    'narrative_ref': np.int64,
+}
+# Partition for hits whose date could not be parsed (NaT)
+UNKNOWN_MONTH = 'unknown'
+
+
+def _months(dates):
+    """Partition name (YYYY-MM) per date, UNKNOWN_MONTH for NaT"""
+    return dates.dt.strftime('%Y-%m').fillna(UNKNOWN_MONTH)
+
+
+class CaseStore:
+    """Append-only, month-partitioned columnar store of flagged transactions.
+
+    Layout under `root`:
+      customers.txt          customer ids (as strings), line number = customer code
+      rules.json             rule names, position = bit in rule_mask
+      narratives.jsonl       narrative records, referenced by byte offset
+      YYYY-MM/part-<ns>/     one immutable part per append: a .npy file per column plus
+                             a customer index (sorted codes and their row positions);
+                             hits without a valid date go under unknown/
+
+    Reads memory-map the column files and use the customer index, so looking up one
+    customer touches only the matching rows.
+    """
+
+    def __init__(self, root=CASE_STORE_DIR):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+        self._lock = threading.Lock()
+        self._customers_path = os.path.join(root, 'customers.txt')
+        self._rules_path = os.path.join(root, 'rules.json')
+        self._narratives_path = os.path.join(root, 'narratives.jsonl')
+        self._customer_codes = {}
+        self._customer_ids = []
+        if os.path.exists(self._customers_path):
+            with open(self._customers_path) as f:
+                self._customer_ids = f.read().splitlines()
+            self._customer_codes = {c: i for i, c in enumerate(self._customer_ids)}
+        self._rules = []
+        if os.path.exists(self._rules_path):
+            with open(self._rules_path) as f:
+                self._rules = json.load(f)
+
+    # Dictionaries -----------------------------------------------------------
+
+    def _encode_customers(self, customer_ids):
+        # Ids are stored as text, so 123 and '123' are the same customer before and after a restart
+        customer_ids = customer_ids.astype(str)
+        new = [c for c in pd.unique(customer_ids) if c not in self._customer_codes]
+        if new:
+            with open(self._customers_path, 'a') as f:
+                for customer_id in new:
+                    self._customer_codes[customer_id] = len(self._customer_ids)
+                    self._customer_ids.append(customer_id)
+                    f.write(f"{customer_id}\n")
+        return customer_ids.map(self._customer_codes).to_numpy(dtype=np.int64)
+
+    def _rule_bits(self, rule_names):
+        new = [r for r in rule_names if r not in self._rules]
+        if new:
+            self._rules.extend(new)
+            if len(self._rules) > 64:
+                raise ValueError("Case store rule masks hold at most 64 rules")
+            with open(self._rules_path, 'w') as f:
+                json.dump(self._rules, f)
+        return {rule: np.uint64(1 << self._rules.index(rule)) for rule in rule_names}
+
+    def _write_narratives(self, narratives):
+        refs = {}
+        with open(self._narratives_path, 'ab') as f:
+            for customer_id, narrative in narratives.items():
+                refs[customer_id] = f.tell()
+                record = {'customer_id': str(customer_id), 'saved_at': time.time(), 'narrative': narrative}
+                f.write((json.dumps(record) + '\n').encode())
+        return refs
+
+    # Writing ----------------------------------------------------------------
+
+    def append(self, flagged_transactions, customer_scores=None, narratives=None):
+        """Stores one run's flagged transactions; returns the number of rows written.
+
+        flagged_transactions maps rule name -> flagged frame (as from apply_red_flag_rules).
+        customer_scores defaults to the number of distinct rules each customer broke.
+        narratives optionally maps customer id -> SAR narrative text.
+        Hits already stored with the same rules are skipped, unless the stored copy has no
+        narrative and this one does, so saving the same results twice writes nothing.
+        """
+        frames = [data[['transaction_id', 'customer_id', 'date']].assign(rule=rule)
+                  for rule, data in flagged_transactions.items() if not data.empty]
+        if not frames:
+            return 0
+        hits = pd.concat(frames, ignore_index=True)
+
+        with self._lock:
+            bits = self._rule_bits(list(flagged_transactions))
+            # Bits are distinct per rule, so summing them per transaction ORs them together
+            hits = hits.drop_duplicates(['transaction_id', 'rule'])
+            hits['bit'] = hits['rule'].map(bits).astype(np.uint64)
+            rows = hits.groupby(['transaction_id', 'customer_id'], sort=False).agg(
+                date=('date', 'first'),
+                rule_mask=('bit', 'sum'),
+            ).reset_index()
+
+            if customer_scores is None:
+                customer_scores = hits.groupby('customer_id')['rule'].nunique()
+            rows['date'] = pd.to_datetime(rows['date']).astype('datetime64[s]')
+            rows = self._drop_stored(rows, set(narratives or ()))
+            if rows.empty:
+                return 0
+            narratives = {c: n for c, n in (narratives or {}).items() if c in set(rows['customer_id'])}
+            narrative_refs = self._write_narratives(narratives) if narratives else {}
+
+            rows['customer_code'] = self._encode_customers(rows['customer_id'])
+            rows['customer_score'] = rows['customer_id'].map(customer_scores).fillna(0)
+            rows['narrative_ref'] = rows['customer_id'].map(narrative_refs).fillna(-1)
+
+            for month, part in rows.groupby(_months(rows['date'])):
+                self._write_part(month, part)
+        return len(rows)
+
+    def _drop_stored(self, rows, narrated_customers):
+        """rows without the (transaction_id, rule_mask) hits already stored in their months"""
+        months = _months(rows['date'])
+        keep = np.ones(len(rows), dtype=bool)
+        for month in months.unique():
+            stored = [{column: np.load(os.path.join(part_dir, f"{column}.npy"), mmap_mode='r')
+                       for column in ('transaction_id', 'rule_mask', 'narrative_ref')}
+                      for part_dir in self._parts([month])]
+            if not stored:
+                continue
+            stored = pd.DataFrame({column: np.concatenate([part[column] for part in stored])
+                                   for column in ('transaction_id', 'rule_mask', 'narrative_ref')})
+            stored = stored.assign(narrated=stored['narrative_ref'] >= 0).groupby(
+                ['transaction_id', 'rule_mask'])['narrated'].max()
+            in_month = (months == month).to_numpy()
+            pairs = pd.MultiIndex.from_arrays([rows['transaction_id'].to_numpy()[in_month].astype(np.int64),
+                                               rows['rule_mask'].to_numpy()[in_month].astype(np.uint64)])
+            found = pairs.isin(stored.index)
+            narrated = stored.reindex(pairs).fillna(False).to_numpy(dtype=bool)
+            # A stored hit without a narrative is superseded by the same hit with one
+            adds_narrative = rows['customer_id'][in_month].isin(narrated_customers).to_numpy() & ~narrated
+            keep[in_month] = ~found | adds_narrative
+        return rows[keep]
+
+    def _write_part(self, month, part):
+        month_dir = os.path.join(self.root, month)
+        name = f"part-{time.time_ns()}"
+        tmp_dir = os.path.join(month_dir, f".{name}.tmp")
+        os.makedirs(tmp_dir)
+        for column, dtype in COLUMNS.items():
+            np.save(os.path.join(tmp_dir, f"{column}.npy"), part[column].to_numpy().astype(dtype))
+        codes = part['customer_code'].to_numpy(dtype=np.int64)
+        order = np.argsort(codes, kind='stable')
+        np.save(os.path.join(tmp_dir, 'index_codes.npy'), codes[order])
+        np.save(os.path.join(tmp_dir, 'index_rows.npy'), order.astype(np.int64))
+        # Parts become visible to readers only once complete
+        os.rename(tmp_dir, os.path.join(month_dir, name))
+
+    # Reading ----------------------------------------------------------------
+
+    def months(self):
+        return sorted(d for d in os.listdir(self.root)
+                      if os.path.isdir(os.path.join(self.root, d)) and not d.startswith('.'))
+
+    def _parts(self, months=None):
+        for month in months or self.months():
+            month_dir = os.path.join(self.root, month)
+            if not os.path.isdir(month_dir):
+                continue
+            for name in sorted(os.listdir(month_dir)):
+                if name.startswith('part-'):
+                    yield os.path.join(month_dir, name)
+
+    def rule_names(self, mask):
+        return [rule for bit, rule in enumerate(self._rules) if int(mask) >> bit & 1]
+
+    def customer_history(self, customer_id, months=None, with_narratives=True):
+        """Every stored hit for one customer, newest first"""
+        columns = {column: [] for column in COLUMNS}
+        code = self._customer_codes.get(str(customer_id))
+        if code is not None:
+            for part_dir in self._parts(months):
+                index_codes = np.load(os.path.join(part_dir, 'index_codes.npy'), mmap_mode='r')
+                lo, hi = np.searchsorted(index_codes, [code, code + 1])
+                if lo == hi:
+                    continue
+                rows = np.sort(np.load(os.path.join(part_dir, 'index_rows.npy'), mmap_mode='r')[lo:hi])
+                for column in COLUMNS:
+                    columns[column].append(np.load(os.path.join(part_dir, f"{column}.npy"), mmap_mode='r')[rows])
+
+        history = pd.DataFrame({column: np.concatenate(values) if values else np.array([], dtype=COLUMNS[column])
+                                for column, values in columns.items()})
+        history.insert(1, 'customer_id', customer_id)
+        history = history.drop(columns='customer_code')
+        # Parts are read oldest first; the latest copy of a hit supersedes earlier ones
+        history = history.drop_duplicates(['transaction_id', 'rule_mask'], keep='last')
+        history['rules'] = [self.rule_names(mask) for mask in history['rule_mask']]
+        if with_narratives:
+            narratives = {ref: self.narrative(ref) for ref in set(history['narrative_ref'])}
+            history['narrative'] = history['narrative_ref'].map(narratives)
+        return history.sort_values('date', ascending=False, kind='stable').reset_index(drop=True)
+
+    def narrative(self, ref):
+        if ref < 0:
+            return None
+        with open(self._narratives_path, 'rb') as f:
+            f.seek(int(ref))
+            return json.loads(f.readline())['narrative']
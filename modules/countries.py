@@ -0,0 +1,86 @@
+import difflib
+import re
+import unicodedata
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+ALIASES_PATH = 'data/country_aliases.csv'
+# Minimum difflib similarity for a fuzzy match; high enough to reject e.g. "Unita" -> "United ..."
+FUZZY_CUTOFF = 0.88
+# Stricter cutoff when the match differs by at most CLOSE_EDIT_CHARS characters: in short
+# names that is often a different place ("Saint Martin" vs "Saint Maarten"), not a typo
+CLOSE_EDIT_CHARS = 2
+CLOSE_EDIT_CUTOFF = 0.92
+
+
+def normalize_country_key(value):
+    """Folds case, accents and punctuation so spelling variants compare equal"""
+    text = unicodedata.normalize('NFKD', str(value)).encode('ascii', 'ignore').decode('ascii')
+    text = text.lower().replace('&', ' and ')
+    text = re.sub(r"[^a-z0-9, ]", ' ', text)
+    # "Korea, North" -> "north korea"; a trailing ", of" form like "Iran, Islamic Republic of" is left as is
+    if text.count(',') == 1:
+        head, tail = [part.strip() for part in text.split(',')]
+        if not tail.endswith(' of'):
+            text = f"{tail} {head}"
+    text = text.replace(',', ' ')
+    text = re.sub(r"\bst\b", 'saint', text)
+    text = re.sub(r"^the\b", '', text)
+    return ' '.join(text.split())
+
+
+@lru_cache(maxsize=None)
+def load_country_aliases(file_path=ALIASES_PATH):
+    # keep_default_na=False so Namibia's ISO code "NA" is not read as missing
+    aliases_df = pd.read_csv(file_path, keep_default_na=False, dtype=str)
+    return {normalize_country_key(alias): iso for alias, iso in zip(aliases_df['Alias'], aliases_df['ISO'])}
+
+
+@lru_cache(maxsize=None)
+def resolve_country(value):
+    """Maps one raw country value to an ISO code (or None); cached per distinct value"""
+    if value is None or (isinstance(value, float) and np.isnan(value)):
+        return None
+    aliases = load_country_aliases()
+    key = normalize_country_key(value)
+    if key in aliases:
+        return aliases[key]
+    match = difflib.get_close_matches(key, list(aliases), n=1, cutoff=FUZZY_CUTOFF)
+    if not match:
+        return None
+    matcher = difflib.SequenceMatcher(None, key, match[0])
+    edited = sum(max(i2 - i1, j2 - j1) for tag, i1, i2, j1, j2 in matcher.get_opcodes() if tag != 'equal')
+    # Swapped letters ("Signapore") are a typo, whatever the ratio
+    swapped = sorted(key) == sorted(match[0])
+    if edited <= CLOSE_EDIT_CHARS and matcher.ratio() < CLOSE_EDIT_CUTOFF and not swapped:
+        return None
+    return aliases[match[0]]
+
+
+def country_codes(countries):
+    """Returns a categorical Series of ISO codes aligned with `countries`"""
+    # Resolve distinct values only; the trailing entry is what missing values (code -1) pick up
+    categorical = countries.astype('category')
+    lookup = np.array([resolve_country(c) for c in categorical.cat.categories] + [None], dtype=object)
+    return pd.Series(lookup[categorical.cat.codes.to_numpy()], index=countries.index, dtype='category')
+
+
+def match_countries(countries, reference_names):
+    """Boolean mask of `countries` that refer to any country in `reference_names`.
+
+    Reference entries that do not resolve to a country (e.g. organisation names in
+    the high-risk list) still match on their exact raw value.
+    """
+    targets = set()
+    raw_targets = set()
+    for name in reference_names:
+        code = resolve_country(name)
+        if code is None:
+            raw_targets.add(name)
+        else:
+            targets.add(code)
+
+    categorical = countries.astype('category')
+    return country_codes(categorical).isin(targets) | categorical.isin(raw_targets)
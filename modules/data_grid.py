@@ -0,0 +1,121 @@
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+from modules.data_processing import frame_fingerprint
+
+DEFAULT_PAGE_SIZE = 50
+MAX_TEXT_LENGTH = 80
+
+
+def rule_hit_mask(data, flagged_transactions, rule_names):
+    """Bitmask per row of `data`: bit i is set when the row was flagged by rule_names[i]"""
+    mask = np.zeros(len(data), dtype=np.uint64)
+    transaction_ids = data['transaction_id']
+    for bit, rule in enumerate(rule_names):
+        if rule in flagged_transactions:
+            hits = transaction_ids.isin(flagged_transactions[rule]['transaction_id']).to_numpy()
+            mask[hits] |= np.uint64(1 << bit)
+    return mask
+
+
+class GridSource:
+    """Server-side state for a table: the full frame plus lazily built lookup indexes"""
+
+    def __init__(self, data, rule_names=None, rule_hits=None):
+        self.data = data
+        self.rule_names = list(rule_names or [])
+        self.rule_hits = rule_hits
+        self._customer_index = None
+        self._sort_orders = {}
+
+    @property
+    def customer_index(self):
+        if self._customer_index is None:
+            self._customer_index = self.data.groupby('customer_id', sort=False).indices
+        return self._customer_index
+
+    def sort_order(self, column):
+        """Row positions ordered by `column`, computed once per column"""
+        if column not in self._sort_orders:
+            values = self.data[column].reset_index(drop=True)
+            self._sort_orders[column] = values.sort_values(kind='stable').index.to_numpy()
+        return self._sort_orders[column]
+
+    def view(self, customer=None, rules=None, sort_by=None, ascending=True):
+        """Positions of the rows matching the filters, in display order"""
+        keep = None
+        if customer:
+            keep = np.zeros(len(self.data), dtype=bool)
+            keep[self.customer_index.get(customer, [])] = True
+        if rules and self.rule_hits is not None:
+            bits = np.uint64(sum(1 << self.rule_names.index(rule) for rule in rules))
+            hits = (self.rule_hits & bits) != 0
+            keep = hits if keep is None else keep & hits
+
+        if sort_by:
+            order = self.sort_order(sort_by)
+            if not ascending:
+                order = order[::-1]
+            return order if keep is None else order[keep[order]]
+        return np.arange(len(self.data)) if keep is None else np.flatnonzero(keep)
+
+    def window(self, positions, page, page_size=DEFAULT_PAGE_SIZE, max_text_length=MAX_TEXT_LENGTH):
+        """The rows of one page, with long text cells cut to max_text_length"""
+        start = (page - 1) * page_size
+        rows = self.data.iloc[positions[start:start + page_size]].copy()
+        for column in rows.columns:
+            if rows[column].dtype == object or pd.api.types.is_string_dtype(rows[column]):
+                text = rows[column].astype(str).str.replace('\n', ' ', regex=False)
+                long = text.str.len() > max_text_length
+                rows[column] = text.where(~long, text.str.slice(0, max_text_length - 1) + '…')
+        return rows
+
+
+def get_grid_source(data, key, rule_names=None, flagged_transactions=None, fingerprint=None):
+    """Returns the GridSource for `key`, rebuilding it only when the frame changes.
+
+    fingerprint identifies the frame's contents (e.g. derived from a key the caller
+    already computed); without one the whole frame is hashed on every render.
+    """
+    state_key = f"grid_source_{key}"
+    fingerprint = frame_fingerprint(data) if fingerprint is None else fingerprint
+    cached = st.session_state.get(state_key)
+    if cached is None or cached[0] != fingerprint:
+        rule_hits = None
+        if flagged_transactions is not None and rule_names:
+            rule_hits = rule_hit_mask(data, flagged_transactions, rule_names)
+        cached = (fingerprint, GridSource(data, rule_names, rule_hits))
+        st.session_state[state_key] = cached
+    return cached[1]
+
+
+def render_data_grid(data, key, page_size=DEFAULT_PAGE_SIZE, rule_names=None,
+                     flagged_transactions=None, max_text_length=MAX_TEXT_LENGTH, fingerprint=None):
+    """Paginated table that keeps the full frame on the server and sends only one page to the browser"""
+    source = get_grid_source(data, key, rule_names, flagged_transactions, fingerprint)
+
+    col1, col2, col3, col4 = st.columns([2, 1, 2, 1])
+    with col1:
+        sort_by = st.selectbox("Sort by", [None] + list(data.columns), key=f"{key}_sort",
+                               format_func=lambda c: "(original order)" if c is None else c)
+    with col2:
+        ascending = st.radio("Order", ["Asc", "Desc"], horizontal=True, key=f"{key}_order") == "Asc"
+    with col3:
+        customer = st.text_input("Customer ID", key=f"{key}_customer").strip()
+    rules = None
+    if source.rule_hits is not None:
+        rules = st.multiselect("Flagged by rule", source.rule_names, key=f"{key}_rules")
+
+    positions = source.view(customer=customer or None, rules=rules, sort_by=sort_by, ascending=ascending)
+    total_pages = max(1, (len(positions) + page_size - 1) // page_size)
+    # Filters can shrink the result below the page the user was on
+    if st.session_state.get(f"{key}_page", 1) > total_pages:
+        st.session_state[f"{key}_page"] = total_pages
+    with col4:
+        page = st.number_input("Page", min_value=1, max_value=total_pages, key=f"{key}_page")
+
+    start = (page - 1) * page_size
+    st.dataframe(source.window(positions, page, page_size, max_text_length))
+    st.caption(f"Rows {min(start + 1, len(positions)):,}–{min(start + page_size, len(positions)):,} "
+               f"of {len(positions):,} (page {page} of {total_pages:,})")
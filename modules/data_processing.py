@@ -1,33 +1,218 @@
+import hashlib
+import weakref
+
 import pandas as pd
-import streamlit as st
+
+
+def _update_digest(digest, values):
+    if hasattr(values.array, '__arrow_array__'):
+        # Arrow-backed strings: digest the buffers directly, much faster than hashing each value
+        import pyarrow as pa
+
+        for chunk in pa.chunked_array(values.array.__arrow_array__()).chunks:
+            if chunk.offset:
+                chunk = pa.concat_arrays([chunk])  # a compact copy, so only this slice's bytes are read
+            digest.update(str(len(chunk)).encode())
+            for buffer in chunk.buffers():
+                if buffer is not None:
+                    digest.update(buffer)
+    else:
+        digest.update(pd.util.hash_array(values.to_numpy()).tobytes())
+
+
+def frame_fingerprint(data):
+    """Identity for a frame across reruns and sessions: a digest of the columns, index and every value"""
+    digest = hashlib.sha1(repr((len(data), list(data.columns), [str(dtype) for dtype in data.dtypes])).encode())
+    _update_digest(digest, data.index.to_series())
+    for _, values in data.items():
+        _update_digest(digest, values)
+    return digest.hexdigest()
+
+
+# Format of the `date` column in transaction extracts; parsed with this fixed format
+# rather than per-value inference
+DATE_FORMAT = '%Y-%m-%d %H:%M:%S'
+BUSINESS_HOURS = (9, 17)
+
+
+def parse_dates(values, date_format=DATE_FORMAT):
+    """Parses a date column once, vectorized; falls back to ISO 8601 if the format does not fit"""
+    if pd.api.types.is_datetime64_any_dtype(values):
+        return values
+    parsed = pd.to_datetime(values, format=date_format, errors='coerce')
+    if parsed.isna().sum() > values.isna().sum():
+        parsed = pd.to_datetime(values, format='ISO8601', errors='coerce')
+    return parsed
+
+
+def _time_of_day(dates):
+    # Code -1 is a missing value, which is what NaT dates get
+    bins = (dates.dt.hour // 6).fillna(-1).to_numpy(dtype='int64')
+    labels = pd.Categorical.from_codes(bins, ['night', 'morning', 'afternoon', 'evening'])
+    return pd.Series(labels, index=dates.index)
+
+
+# Derived date features, computed from the parsed `date` column on first access
+DATE_FEATURES = {
+    'year': lambda d: d.dt.year,
+    'month': lambda d: d.dt.month,
+    'day': lambda d: d.dt.day,
+    'weekday': lambda d: d.dt.weekday,
+    'hour': lambda d: d.dt.hour,
+    'week': lambda d: d.dt.isocalendar().week.astype('Int64'),  # nullable, NaT dates have no week
+    'calendar_day': lambda d: d.dt.normalize(),
+    'year_month': lambda d: d.dt.to_period('M'),
+    'is_weekend': lambda d: d.dt.weekday >= 5,
+    'is_business_hours': lambda d: (d.dt.weekday < 5) & d.dt.hour.between(BUSINESS_HOURS[0], BUSINESS_HOURS[1] - 1),
+    'time_of_day': _time_of_day,
+}
+
+
+# Computed features per frame, keyed by id(frame). pandas builds a new accessor on
+# every `data.features` access, so the cache cannot live on the accessor itself.
+_feature_caches = {}
+
+
+def _feature_cache(data):
+    key = id(data)
+    cache = _feature_caches.get(key)
+    if cache is None:
+        cache = _feature_caches[key] = {}
+        # Dropped with the frame, before its id can be reused
+        weakref.finalize(data, _feature_caches.pop, key, None)
+    return cache
+
+
+@pd.api.extensions.register_dataframe_accessor('features')
+class DateFeatures:
+    """Lazy date features: `data.features['weekday']` computes the feature on first access.
+
+    Results are cached per frame (outside the frame, without adding columns) until the
+    frame is garbage collected, so each feature is computed at most once per frame and
+    only if something uses it. If the `date` column is modified afterwards, call
+    `data.features.clear()`.
+    """
+
+    def __init__(self, data):
+        self._data = data
+        self._cache = _feature_cache(data)
+
+    @property
+    def dates(self):
+        if 'date' not in self._cache:
+            self._cache['date'] = parse_dates(self._data['date'])
+        return self._cache['date']
+
+    def __getitem__(self, name):
+        if name not in self._cache:
+            if name not in DATE_FEATURES:
+                raise KeyError(f"Unknown date feature: {name}")
+            self._cache[name] = DATE_FEATURES[name](self.dates).rename(name)
+        return self._cache[name]
+
+    def materialize(self, names):
+        """Adds the given features as real columns, e.g. before exporting the frame"""
+        for name in names:
+            self._data[name] = self[name]
+        return self._data
+
+    def clear(self):
+        self._cache.clear()
+
+
+# Prefixes of the per-category count columns in the customer summary table
+TYPE_PREFIX = 'type:'
+COUNTRY_PREFIX = 'country:'
+
+
+def _breakdown(row, prefix):
+    counts = row[[c for c in row.index if c.startswith(prefix)]]
+    counts = counts[counts > 0].sort_values(ascending=False)
+    return {c[len(prefix):]: int(n) for c, n in counts.items()}
+
 
 class TransactionProcessor:
+    def __init__(self):
+        self._summaries = None
+        self._summaries_key = None
+
     @staticmethod
     def load_data(file):
         try:
             data = pd.read_csv(file)
-            data['date'] = pd.to_datetime(data['date'])
+            data['date'] = parse_dates(data['date'])
             return data
         except Exception as e:
+            import streamlit as st  # UI only; keeps this module importable by batch jobs
             st.error(f"Error loading data: {e}")
             return None
 
     @staticmethod
     def preprocess_transactions(data):
-        # Add preprocessing steps here
-        # Example:
-        data['month'] = data['date'].dt.month
-        data['day'] = data['date'].dt.day
-        data['weekday'] = data['date'].dt.weekday
+        # Calendar features (month, day, weekday, ...) are derived lazily via data.features
+        data['date'] = parse_dates(data['date'])
         return data
 
     @staticmethod
-    def get_customer_summary(data, customer_id):
-        customer_data = data[data['customer_id'] == customer_id]
-        summary = {
-            'total_transactions': len(customer_data),
-            'total_amount': customer_data['amount'].sum(),
-            'avg_transaction': customer_data['amount'].mean(),
-            'transaction_types': customer_data['type'].value_counts().to_dict()
+    def summarize_customers(data):
+        """Summary table for every customer, indexed by customer_id.
+
+        Totals, averages and date ranges come from one grouped aggregation; type and
+        country breakdowns are count columns prefixed with `type:` / `country:`.
+        """
+        grouped = data.groupby('customer_id', sort=True)
+        summaries = grouped.agg(
+            total_transactions=('amount', 'size'),
+            total_amount=('amount', 'sum'),
+            avg_transaction=('amount', 'mean'),
+            max_transaction=('amount', 'max'),
+            first_date=('date', 'min'),
+            last_date=('date', 'max'),
+        )
+        for column, prefix in (('transaction_type', TYPE_PREFIX), ('country', COUNTRY_PREFIX)):
+            if column in data.columns:
+                counts = data.groupby(['customer_id', column], sort=False).size().unstack(fill_value=0)
+                summaries = summaries.join(counts.add_prefix(prefix))
+        return summaries
+
+    def customer_summaries(self, data, key=None):
+        """The summary table for data, recomputed only when the frame changes.
+
+        key is the frame's fingerprint; pass it when the caller already has one, so the
+        frame is not hashed again.
+        """
+        key = frame_fingerprint(data) if key is None else key
+        if key != self._summaries_key:
+            self._summaries = self.summarize_customers(data)
+            self._summaries_key = key
+        return self._summaries
+
+    @staticmethod
+    def overall_summary(summaries):
+        """Totals across the customers of a summary table"""
+        total_transactions = int(summaries['total_transactions'].sum())
+        total_amount = summaries['total_amount'].sum()
+        return {
+            'total_transactions': total_transactions,
+            'total_amount': total_amount,
+            'avg_transaction': total_amount / total_transactions if total_transactions else 0.0,
+            'unique_customers': len(summaries),
+        }
+
+    @staticmethod
+    def get_customer_summary(summaries, customer_id):
+        """One customer's row of a summary table (from customer_summaries), as a dict"""
+        if customer_id not in summaries.index:
+            return None
+        row = summaries.loc[customer_id]
+        return {
+            'total_transactions': int(row['total_transactions']),
+            'total_amount': row['total_amount'],
+            'avg_transaction': row['avg_transaction'],
+            'max_transaction': row['max_transaction'],
+            'first_date': row['first_date'],
+            'last_date': row['last_date'],
+            'unique_customers': 1,
+            'transaction_types': _breakdown(row, TYPE_PREFIX),
+            'countries': _breakdown(row, COUNTRY_PREFIX),
         }
-        return summary
@@ -0,0 +1,99 @@
+import glob
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+
+from modules.data_processing import parse_dates
+
+# Column types of a transaction extract; parsing with them skips per-column type inference
+SCHEMA = {
+    'transaction_id': 'int64',
+    'customer_id': 'str',
+    'account_id': 'int64',
+    'amount': 'float64',
+    'transaction_type': 'str',
+    'country': 'str',
+    'date': 'str',
+    'velocity': 'int64',
+    'account_balance': 'float64',
+    'description': 'str',
+}
+REQUIRED_COLUMNS = ['transaction_id', 'customer_id', 'amount', 'transaction_type', 'country', 'date']
+EXTRACT_PATTERNS = ['*.csv', '*.csv.gz', '*.csv.zst']
+# Directory the app may load extracts from; UI paths and globs are resolved inside it
+EXTRACTS_ROOT = os.environ.get('SARGEN_EXTRACTS_ROOT', 'data/extracts')
+
+
+def _inside(path, root):
+    return os.path.commonpath([os.path.realpath(path), root]) == root
+
+
+def resolve_paths(source, root=None):
+    """Files for a directory, a glob pattern or a list of paths, in sorted order.
+
+    With root, source is taken relative to it and anything resolving outside root
+    (absolute paths, `..`, symlinks) raises ValueError.
+    """
+    if root is not None:
+        root = os.path.realpath(root)
+        sources = source if isinstance(source, (list, tuple)) else [source]
+        if any(os.path.isabs(s) or not _inside(os.path.join(root, s), root) for s in sources):
+            raise ValueError(f"Extracts must be inside {root}")
+        source = [os.path.join(root, s) for s in source] if isinstance(source, (list, tuple)) \
+            else os.path.join(root, source)
+    if isinstance(source, (list, tuple)):
+        paths = sorted(source)
+    elif os.path.isdir(source):
+        paths = sorted(path for pattern in EXTRACT_PATTERNS
+                       for path in glob.glob(os.path.join(source, '**', pattern), recursive=True))
+    else:
+        paths = sorted(glob.glob(source, recursive=True))
+    if root is not None:
+        paths = [path for path in paths if _inside(path, root)]
+    return paths
+
+
+def read_extract(path, schema=SCHEMA, required_columns=REQUIRED_COLUMNS):
+    """Parses one extract with the typed schema; .gz and .zst files are decompressed as a stream"""
+    header = pd.read_csv(path, nrows=0).columns
+    missing = [column for column in required_columns if column not in header]
+    if missing:
+        raise ValueError(f"missing columns: {', '.join(missing)}")
+    data = pd.read_csv(path, dtype={c: t for c, t in schema.items() if c in header})
+    data['date'] = parse_dates(data['date'])
+    return data
+
+
+def _read_timed(path, schema, required_columns):
+    start = time.perf_counter()
+    record = {'file': path, 'bytes': os.path.getsize(path), 'rows': 0, 'seconds': 0.0, 'error': None}
+    data = None
+    try:
+        data = read_extract(path, schema, required_columns)
+        record['rows'] = len(data)
+    except Exception as e:
+        record['error'] = f"{type(e).__name__}: {e}"
+    record['seconds'] = time.perf_counter() - start
+    return data, record
+
+
+def load_extracts(source, max_workers=None, schema=SCHEMA, required_columns=REQUIRED_COLUMNS, root=None):
+    """Loads every extract under source in a thread pool and concatenates them.
+
+    Returns (data, report): data is None if no file could be read; report has one row
+    per file with its size, row count, parse time and error (None when it loaded).
+    Files that fail are reported and skipped. See resolve_paths for root.
+    """
+    paths = resolve_paths(source, root)
+    if not paths:
+        raise FileNotFoundError(f"No transaction extracts found for {source}")
+    with ThreadPoolExecutor(max_workers=max_workers or min(8, os.cpu_count() or 1)) as executor:
+        results = list(executor.map(lambda path: _read_timed(path, schema, required_columns), paths))
+
+    report = pd.DataFrame([record for _, record in results])
+    frames = [data for data, _ in results if data is not None and not data.empty]
+    if not frames:
+        return None, report
+    return pd.concat(frames, ignore_index=True), report
@@ -0,0 +1,238 @@
+import json
+import os
+import pickle
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from red_flag_rules import CROSS_CUSTOMER_RULES, PROFILE_RULES, apply_red_flag_rules
+from modules.backtesting import sweep_threshold
+from modules.profiling import Profiler, activate, deactivate, span
+
+JOBS_DB_PATH = 'data/jobs.sqlite'
+JOB_RESULTS_DIR = 'data/job_results'
+# Finished jobs and their pickled results are deleted after this long
+RESULT_RETENTION_SECONDS = 7 * 24 * 3600
+PURGE_INTERVAL_SECONDS = 3600
+
+QUEUED = 'queued'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+
+# The synchronous narrative generators return failures as text starting with this
+NARRATIVE_ERROR_PREFIX = "Error generating SAR narrative:"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    job_id TEXT PRIMARY KEY,
+    job_key TEXT,
+    kind TEXT NOT NULL,
+    owner TEXT,
+    status TEXT NOT NULL,
+    progress REAL NOT NULL DEFAULT 0,
+    message TEXT,
+    error TEXT,
+    result_path TEXT,
+    params TEXT,
+    spans TEXT,
+    submitted_at REAL,
+    started_at REAL,
+    finished_at REAL
+);
+CREATE INDEX IF NOT EXISTS jobs_by_key ON jobs (job_key);
+"""
+
+
+class JobQueue:
+    """Background worker pool with an on-disk (SQLite) job table.
+
+    Jobs run on a thread pool shared by every session in the server process. Status,
+    progress and the pickled result are kept on disk, so they survive Streamlit reruns
+    and page changes and can be fetched later by job id. Each job's profiling spans are
+    stored with it, and finished jobs are purged after `retention` seconds.
+    """
+
+    def __init__(self, db_path=JOBS_DB_PATH, results_dir=JOB_RESULTS_DIR, max_workers=4,
+                 retention=RESULT_RETENTION_SECONDS):
+        self.db_path = db_path
+        self.results_dir = results_dir
+        self.retention = retention
+        os.makedirs(os.path.dirname(db_path) or '.', exist_ok=True)
+        os.makedirs(results_dir, exist_ok=True)
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='sargen-job')
+        self._lock = threading.Lock()
+        with self._connect() as conn:
+            conn.executescript(_SCHEMA)
+            if 'spans' not in {row[1] for row in conn.execute("PRAGMA table_info(jobs)")}:
+                conn.execute("ALTER TABLE jobs ADD COLUMN spans TEXT")
+            # Work in flight when a previous server process stopped will never finish
+            conn.execute("UPDATE jobs SET status = ?, error = ? WHERE status IN (?, ?)",
+                         (FAILED, 'Interrupted by server restart', QUEUED, RUNNING))
+        self.purge()
+
+    def _connect(self):
+        return sqlite3.connect(self.db_path, timeout=30)
+
+    def _update(self, job_id, **fields):
+        assignments = ', '.join(f"{name} = ?" for name in fields)
+        with self._lock, self._connect() as conn:
+            conn.execute(f"UPDATE jobs SET {assignments} WHERE job_id = ?", (*fields.values(), job_id))
+
+    def submit(self, kind, func, *args, job_key=None, owner=None, params=None, force=False, **kwargs):
+        """Queues func(*args, progress=callback, **kwargs) and returns the job id.
+
+        With a job_key, an existing queued, running or finished job for the same key is
+        reused instead of starting the work again, unless force is set.
+        """
+        if time.time() - self._last_purge > PURGE_INTERVAL_SECONDS:
+            self.purge()
+        job_id = uuid.uuid4().hex
+        with self._lock, self._connect() as conn:
+            if job_key is not None and not force:
+                existing = self.find(job_key)
+                if existing is not None and existing['status'] != FAILED:
+                    return existing['job_id']
+            conn.execute(
+                "INSERT INTO jobs (job_id, job_key, kind, owner, status, params, submitted_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (job_id, job_key, kind, owner, QUEUED, json.dumps(params or {}, default=str), time.time())
+            )
+        self._executor.submit(self._run, job_id, func, args, kwargs)
+        return job_id
+
+    def _run(self, job_id, func, args, kwargs):
+        self._update(job_id, status=RUNNING, started_at=time.time())
+        # Spans from this job go to its own profiler, returned with the result by spans()
+        profiler = activate(Profiler(track_memory=False))
+
+        def progress(fraction, message=None):
+            self._update(job_id, progress=float(fraction), message=message)
+
+        try:
+            result = func(*args, progress=progress, **kwargs)
+            result_path = os.path.join(self.results_dir, f"{job_id}.pkl")
+            with open(result_path, 'wb') as f:
+                pickle.dump(result, f)
+            self._update(job_id, status=DONE, progress=1.0, result_path=result_path, finished_at=time.time(),
+                         spans=profiler.to_json(indent=None))
+        except Exception as e:
+            self._update(job_id, status=FAILED, error=str(e), finished_at=time.time(),
+                         spans=profiler.to_json(indent=None))
+        finally:
+            deactivate()
+
+    def purge(self, older_than=None):
+        """Deletes jobs that finished more than `older_than` seconds ago (default: retention) and their results"""
+        self._last_purge = time.time()
+        cutoff = self._last_purge - (self.retention if older_than is None else older_than)
+        with self._lock, self._connect() as conn:
+            expired = conn.execute("SELECT job_id, result_path FROM jobs WHERE finished_at < ?",
+                                   (cutoff,)).fetchall()
+            conn.executemany("DELETE FROM jobs WHERE job_id = ?", [(job_id,) for job_id, _ in expired])
+        for _, result_path in expired:
+            if result_path and os.path.exists(result_path):
+                os.remove(result_path)
+        return len(expired)
+
+    def status(self, job_id):
+        with self._connect() as conn:
+            conn.row_factory = sqlite3.Row
+            row = conn.execute("SELECT * FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+        return dict(row) if row else None
+
+    def find(self, job_key):
+        """Most recent job submitted with job_key, or None"""
+        with self._connect() as conn:
+            conn.row_factory = sqlite3.Row
+            row = conn.execute("SELECT * FROM jobs WHERE job_key = ? ORDER BY submitted_at DESC LIMIT 1",
+                               (job_key,)).fetchone()
+        return dict(row) if row else None
+
+    def list_jobs(self, owner=None, kind=None, limit=50):
+        query = "SELECT * FROM jobs WHERE 1 = 1"
+        args = []
+        if owner is not None:
+            query += " AND owner = ?"
+            args.append(owner)
+        if kind is not None:
+            query += " AND kind = ?"
+            args.append(kind)
+        query += " ORDER BY submitted_at DESC LIMIT ?"
+        args.append(limit)
+        with self._connect() as conn:
+            conn.row_factory = sqlite3.Row
+            return [dict(row) for row in conn.execute(query, args).fetchall()]
+
+    def result(self, job_id):
+        """Result of a finished job; raises if it failed or has not finished"""
+        job = self.status(job_id)
+        if job is None:
+            raise KeyError(f"Unknown job: {job_id}")
+        if job['status'] == FAILED:
+            raise RuntimeError(job['error'])
+        if job['status'] != DONE:
+            raise RuntimeError(f"Job {job_id} is {job['status']}")
+        with open(job['result_path'], 'rb') as f:
+            return pickle.load(f)
+
+    def spans(self, job_id):
+        """Profiling spans recorded while the job ran"""
+        job = self.status(job_id)
+        return json.loads(job['spans']) if job and job['spans'] else []
+
+    def shutdown(self, wait=True):
+        self._executor.shutdown(wait=wait)
+
+
+def stored_profiles(profile_store, transactions, rule_names):
+    """Profiles from the store with this batch folded in, or None if no selected rule uses them"""
+    if profile_store is None or not PROFILE_RULES.intersection(rule_names):
+        return None
+    with span('baseline_profiles', rows=len(transactions)):
+        return profile_store.profiles_for(transactions)
+
+
+def detection_job(transactions, selected_rules, customer_id=None, profile_store=None, progress=None):
+    """Runs the selected rules one at a time, reporting progress after each.
+
+    With a profile_store, baseline rules score against the stored customer history,
+    updated with this batch (the full batch, even when filtering to one customer).
+    """
+    profiles = stored_profiles(profile_store, transactions, selected_rules)
+    customer_transactions = transactions
+    if customer_id:
+        customer_transactions = transactions[transactions['customer_id'] == customer_id]
+    flagged_transactions = {}
+    for i, rule_name in enumerate(selected_rules):
+        if progress:
+            progress(i / len(selected_rules), f"Applying {rule_name}")
+        if customer_id and rule_name in CROSS_CUSTOMER_RULES:
+            # Needs every customer's transactions; apply_red_flag_rules filters its hits
+            flagged_transactions.update(apply_red_flag_rules(transactions, [rule_name], customer_id=customer_id,
+                                                             profiles=profiles))
+        else:
+            flagged_transactions.update(apply_red_flag_rules(customer_transactions, [rule_name], profiles=profiles))
+    return flagged_transactions
+
+
+def backtest_job(transactions, rule_name, points, parameter='threshold', profile_store=None, progress=None):
+    """Sweeps one rule's threshold (or other bound) over a grid of `points` values, with the same baselines as detection"""
+    if progress:
+        progress(0.0, f"Sweeping {rule_name} {parameter}")
+    profiles = stored_profiles(profile_store, transactions, PROFILE_RULES)
+    with span(f"backtest:{rule_name}", rows=len(transactions), parameter=parameter):
+        return sweep_threshold(transactions, rule_name, points=points, profiles=profiles, parameter=parameter)
+
+
+def narrative_job(customer_id, rules, records, generate, progress=None):
+    """Drafts one SAR narrative with the given generate_sar_narrative implementation"""
+    if progress:
+        progress(0.0, f"Drafting narrative for {customer_id}")
+    narrative = generate(customer_id, rules, records)
+    # Fail the job rather than cache the error text as the customer's draft
+    if narrative.startswith(NARRATIVE_ERROR_PREFIX):
+        raise RuntimeError(narrative[len(NARRATIVE_ERROR_PREFIX):].strip())
+    return narrative
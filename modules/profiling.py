@@ -0,0 +1,137 @@
+import functools
+import json
+import logging
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+logger = logging.getLogger('sargen.profiling')
+
+
+class Profiler:
+    """Collects timing spans (duration, rows, rows/s, peak memory) for one analysis run.
+
+    Peak memory comes from tracemalloc, whose peak counter is process-wide: spans running
+    at the same time on other sessions or job threads add to each other's peaks, so treat
+    the figure as approximate unless the run has the process to itself (e.g. benchmarks).
+    """
+
+    def __init__(self, track_memory=True, keep_spans=True):
+        self.track_memory = track_memory
+        self.keep_spans = keep_spans
+        self.spans = []
+        self._stack = []
+
+    def reset(self):
+        self.spans = []
+        self._stack = []
+
+    @contextmanager
+    def span(self, name, rows=None, **attrs):
+        """Times the enclosed block; set record['rows'] inside the block if unknown upfront"""
+        record = {'name': name, 'rows': rows, **attrs}
+        frame = {'peak': 0, 'base': 0}
+        memory = self.track_memory and tracemalloc.is_tracing()
+        if memory:
+            current, peak = tracemalloc.get_traced_memory()
+            # Keep the enclosing span's peak before resetting the counter for this one
+            if self._stack:
+                self._stack[-1]['peak'] = max(self._stack[-1]['peak'], peak - self._stack[-1]['base'])
+            frame['base'] = current
+            tracemalloc.reset_peak()
+        self._stack.append(frame)
+        start = time.perf_counter()
+        try:
+            yield record
+        finally:
+            record['seconds'] = time.perf_counter() - start
+            self._stack.pop()
+            if memory:
+                _, peak = tracemalloc.get_traced_memory()
+                frame['peak'] = max(frame['peak'], peak - frame['base'])
+                record['peak_memory_mb'] = frame['peak'] / 2 ** 20
+                if self._stack:
+                    self._stack[-1]['peak'] = max(self._stack[-1]['peak'], peak - self._stack[-1]['base'])
+            if record['rows'] is not None and record['seconds'] > 0:
+                record['rows_per_s'] = record['rows'] / record['seconds']
+            record['depth'] = len(self._stack)
+            if self.keep_spans:
+                self.spans.append(record)
+            logger.info(json.dumps(record, default=str))
+
+    def to_records(self):
+        return list(self.spans)
+
+    def to_json(self, indent=2):
+        return json.dumps(self.spans, indent=indent, default=str)
+
+    def export(self, file_path):
+        with open(file_path, 'w') as f:
+            f.write(self.to_json())
+
+
+# Spans on threads without an active profiler are only logged, so it never grows
+_default_profiler = Profiler(track_memory=False, keep_spans=False)
+# Thread id -> (thread, profiler). Kept in one dict rather than a threading.local so
+# tracing can be stopped once no live thread has a memory-tracking profiler.
+_active = {}
+_active_lock = threading.Lock()
+_started_tracing = False
+
+
+def _update_tracing():
+    # Caller holds _active_lock
+    global _started_tracing
+    for ident, (thread, _) in list(_active.items()):
+        if not thread.is_alive():
+            del _active[ident]
+    needed = any(profiler.track_memory for _, profiler in _active.values())
+    if needed and not tracemalloc.is_tracing():
+        tracemalloc.start()
+        _started_tracing = True
+    elif not needed and _started_tracing and tracemalloc.is_tracing():
+        # Only stop tracing this module started (not e.g. `python -X tracemalloc`)
+        tracemalloc.stop()
+        _started_tracing = False
+
+
+def activate(profiler):
+    """Makes `profiler` the target of span() calls on the current thread (e.g. one Streamlit session).
+
+    tracemalloc runs only while some live thread has an active memory-tracking profiler.
+    """
+    thread = threading.current_thread()
+    with _active_lock:
+        _active[thread.ident] = (thread, profiler)
+        _update_tracing()
+    return profiler
+
+
+def deactivate():
+    """Detaches the current thread's profiler; spans go back to the logging-only default"""
+    with _active_lock:
+        _active.pop(threading.get_ident(), None)
+        _update_tracing()
+
+
+def current_profiler():
+    thread, profiler = _active.get(threading.get_ident(), (None, _default_profiler))
+    # Thread ids are reused; a profiler left by a finished thread does not apply
+    return profiler if thread is threading.current_thread() else _default_profiler
+
+
+def span(name, rows=None, **attrs):
+    return current_profiler().span(name, rows=rows, **attrs)
+
+
+def profiled(name, rows_arg=0):
+    """Decorator timing a function; rows are the length of its positional argument `rows_arg`"""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            rows = len(args[rows_arg]) if len(args) > rows_arg and hasattr(args[rows_arg], '__len__') else None
+            with span(name, rows=rows):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
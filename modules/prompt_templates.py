@@ -0,0 +1,155 @@
+import functools
+import hashlib
+import json
+import re
+import string
+
+STRUCTURED_INSTRUCTIONS = """Generate a professional Suspicious Activity Report (SAR) narrative using the following format and guidelines:
+
+SUMMARY OF SUSPICIOUS ACTIVITY
+[Provide a concise overview including:
+- Nature and pattern of suspicious activities
+- Total value of suspicious transactions
+- Time period of suspicious activity]
+
+CUSTOMER DETAILS
+[Include:
+- Account type and relationship
+- Account history and business type
+- Relevant customer background]
+
+TRANSACTION PATTERNS
+[Detail:
+- Analysis of transaction frequency
+- Transaction amounts and patterns
+- Unusual behaviors or deviations
+- Specific examples with dates and amounts]
+
+RED FLAGS IDENTIFIED
+[For each rule violation listed with the customer data below:
+- Describe the specific violation pattern
+- Provide supporting transaction evidence
+- Explain why the pattern is suspicious]
+
+CONCLUSION
+[Include:
+- Overall risk assessment
+- Summary of primary concerns
+- Recommended actions]
+
+Guidelines:
+1. Use precise, factual language
+2. Avoid speculation or personal opinions
+3. Focus on objective patterns and evidence
+4. Format monetary values as "$X,XXX.XX"
+5. Use proper date formatting (MM/DD/YYYY)
+6. Maintain professional tone throughout
+7. Reference specific transactions where relevant
+8. Organize information in clear, logical sections
+
+Do not include any introductory text before the first section header.
+"""
+
+COMPLIANCE_OFFICER_INSTRUCTIONS = """You are a compliance officer tasked with generating a Suspicious Activity Report (SAR) narrative for the customer described at the end of this message.
+
+Please generate a comprehensive SAR narrative that includes:
+1. A clear description of each suspicious activity and why it is considered suspicious (Who conducted the activity? What types of transactions were involved?).
+2. Specific transaction details that highlight the suspicious behavior (When did the transactions occur? Where did the activity take place?).
+3. Any patterns or connections between the transactions.
+4. The potential implications of these activities and why they raise red flags (Why does the Bank think the activity is suspicious? How did the suspicious activity occur?).
+5. An introductory paragraph providing information on the financial institution, the subject(s) of the SAR, the account(s) involved, the date range of the suspicious activity, the nature of the suspicious activity, and the total amount of the suspicious activity.
+6. A conclusion paragraph indicating any follow-up planned by the institution and any other pertinent information.
+
+Ensure the narrative is clear, concise, and suitable for submission to regulatory authorities.
+EXTREMELY IMPORTANT: Ensure that the narrative is compliant with the Bank Secrecy Act (BSA) and other relevant regulations, and it should must follow the offical format.
+"""
+
+CUSTOMER_SECTION = """
+Customer ID: {customer_id}
+
+Rule violations: {rules}
+
+Transactions:
+{transactions}
+"""
+
+
+def count_tokens(text):
+    """Token count with tiktoken when installed, otherwise a word/punctuation estimate"""
+    try:
+        import tiktoken
+    except ImportError:
+        return len(re.findall(r"\w+|[^\w\s]", text))
+    return len(tiktoken.get_encoding('cl100k_base').encode(text))
+
+
+class PromptTemplate:
+    """A versioned SAR prompt compiled once.
+
+    The system message and instructions form a static prefix that is byte-identical
+    for every customer; only the customer section after it changes, so provider-side
+    prompt caching and KV reuse can apply. Bump `version` whenever the text changes.
+    """
+
+    def __init__(self, name, version, system, instructions, customer_section=CUSTOMER_SECTION):
+        self.name = name
+        self.version = version
+        self.system = system
+        self.instructions = instructions
+        self._fields = [(literal, field) for literal, field, _, _ in string.Formatter().parse(customer_section)]
+        self.static_prefix = f"{system}\n\n{instructions}"
+        self.fingerprint = hashlib.sha256(f"{self.static_prefix}{customer_section}".encode()).hexdigest()[:12]
+
+    @functools.cached_property
+    def static_tokens(self):
+        # Computed on first use: loading the tokenizer is slow
+        return count_tokens(self.static_prefix)
+
+    @property
+    def key(self):
+        return f"{self.name}@{self.version}"
+
+    def customer_part(self, customer_id, rules, transactions):
+        values = {
+            'customer_id': customer_id,
+            'rules': ', '.join(rules),
+            'transactions': json.dumps(transactions, indent=2, default=str),
+        }
+        return ''.join(literal + (values[field] if field else '') for literal, field in self._fields)
+
+    def user_message(self, customer_id, rules, transactions):
+        return self.instructions + self.customer_part(customer_id, rules, transactions)
+
+    def messages(self, customer_id, rules, transactions):
+        return [
+            {"role": "system", "content": self.system},
+            {"role": "user", "content": self.user_message(customer_id, rules, transactions)},
+        ]
+
+    def completion_prompt(self, customer_id, rules, transactions, answer_cue="SAR NARRATIVE:\n"):
+        """Single-string prompt for /v1/completions endpoints"""
+        return f"{self.static_prefix}{self.customer_part(customer_id, rules, transactions)}\n{answer_cue}"
+
+    def cache_key(self, customer_id, rules, transactions):
+        """Identifies a narrative by template version and inputs, for caches and evaluation runs"""
+        payload = json.dumps([self.key, self.fingerprint, customer_id, sorted(rules), transactions], default=str)
+        return f"{self.key}:{hashlib.sha256(payload.encode()).hexdigest()}"
+
+
+# Version 1 was the per-call f-string prompts in sar_groq.py / sar_generator.py
+TEMPLATES = {
+    'sar_structured': PromptTemplate(
+        'sar_structured', '2',
+        system="You are a professional BSA/AML analyst writing clear, structured SAR narratives.",
+        instructions=STRUCTURED_INSTRUCTIONS,
+    ),
+    'sar_compliance_officer': PromptTemplate(
+        'sar_compliance_officer', '2',
+        system="You are a compliance officer EXPERT in writing and generating SAR narratives.",
+        instructions=COMPLIANCE_OFFICER_INSTRUCTIONS,
+    ),
+}
+
+
+def get_template(name):
+    return TEMPLATES[name]
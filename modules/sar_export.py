@@ -0,0 +1,195 @@
+import csv
+import io
+import json
+import os
+import time
+import zipfile
+from itertools import islice
+
+import numpy as np
+import pandas as pd
+
+EXPORTS_DIR = 'data/exports'
+
+SECTIONS = ["SUMMARY OF SUSPICIOUS ACTIVITY", "CUSTOMER DETAILS",
+            "TRANSACTION PATTERNS", "RED FLAGS IDENTIFIED", "CONCLUSION"]
+
+# FinCEN SAR Part II activity category and subtype for each rule (closest match)
+RULE_ACTIVITY_TYPES = {
+    'high_value_cash_deposits': ('Structuring', 'Transaction(s) below CTR threshold'),
+    'structured_transactions': ('Structuring', 'Transaction(s) below CTR threshold'),
+    'high_risk_country_transactions': ('Other Suspicious Activities',
+                                       'Transaction(s) involving foreign high risk jurisdiction'),
+    'high_velocity_cash_activity': ('Money Laundering', 'Transaction out of pattern for customer(s)'),
+    'keywords_hitting': ('Other Suspicious Activities', 'Other'),
+    'unusual_transaction_patterns': ('Money Laundering', 'Transaction out of pattern for customer(s)'),
+    'large_incoming_wires': ('Other Suspicious Activities',
+                             'Transaction(s) involving foreign high risk jurisdiction'),
+    'baseline_amount_deviation': ('Money Laundering', 'Transaction out of pattern for customer(s)'),
+    'near_duplicate_descriptions': ('Other Suspicious Activities', 'Other'),
+}
+DEFAULT_ACTIVITY_TYPE = ('Other Suspicious Activities', 'Other')
+
+
+def parse_sections(narrative):
+    """Splits a narrative into its SAR sections; text before the first header is dropped"""
+    sections = {}
+    current = None
+    for line in narrative.split('\n'):
+        header = next((s for s in SECTIONS if s.lower() in line.lower()), None)
+        if header:
+            current = header
+            sections.setdefault(current, [])
+        elif current and line.strip() and set(line.strip()) != {'='}:
+            sections[current].append(line)
+    return {section: '\n'.join(lines).strip() for section, lines in sections.items()}
+
+
+def flagged_rows(flagged_transactions, customers):
+    """One row per flagged transaction of the given customers, with the sorted list of rules it broke.
+
+    Returns the rows and, per customer, their row positions.
+    """
+    frames = [data[data['customer_id'].isin(customers)].assign(rule=rule)
+              for rule, data in flagged_transactions.items()]
+    frames = [frame for frame in frames if not frame.empty]
+    if not frames:
+        return None, {}
+    hits = pd.concat(frames, ignore_index=True)
+    # Bits are distinct per rule, so summing them per transaction ORs them together
+    rule_names = list(flagged_transactions)
+    hits['bit'] = hits['rule'].map({rule: 1 << i for i, rule in enumerate(rule_names)})
+    masks = hits.groupby('transaction_id', sort=False)['bit'].sum()
+    rows = hits.drop_duplicates('transaction_id').drop(columns=['rule', 'bit']).set_index('transaction_id')
+    rows['rules'] = masks.map({mask: sorted(rule for i, rule in enumerate(rule_names) if mask >> i & 1)
+                               for mask in masks.unique()})
+    rows = rows.reset_index()
+    return rows, rows.groupby('customer_id', sort=False).indices
+
+
+def records_by_customer(rows):
+    """JSON-ready transaction records grouped by customer"""
+    by_customer = {}
+    for record in json.loads(rows.to_json(orient='records', date_format='iso')):
+        by_customer.setdefault(record['customer_id'], []).append(record)
+    return by_customer
+
+
+def fincen_record(case):
+    """FinCEN SAR-style structured record (subject, Part II activity, narrative) for one case"""
+    categories = sorted({RULE_ACTIVITY_TYPES.get(rule, DEFAULT_ACTIVITY_TYPE) for rule in case['rules']})
+    return {
+        'filing_type': 'Initial report',
+        'subject': {'customer_id': case['customer_id'],
+                    'account_ids': case['account_ids']},
+        'suspicious_activity': {
+            'date_from': case['date_from'],
+            'date_to': case['date_to'],
+            'amount_involved': case['total_amount'],
+            'categories': [{'category': category, 'subtype': subtype} for category, subtype in categories],
+        },
+        'narrative': case['narrative'],
+    }
+
+
+def build_case(customer_id, narrative, records, rules=None, template_key=None):
+    """Everything exported for one customer: narrative, sections, evidence and rule attribution"""
+    dates = sorted(record['date'][:10] for record in records if record.get('date'))
+    rules = sorted(set(rules or []) | {rule for record in records for rule in record.get('rules', [])})
+    return {
+        'customer_id': customer_id,
+        'exported_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'template': template_key,
+        'rules': rules,
+        'rule_hits': {rule: sum(rule in record.get('rules', []) for record in records) for rule in rules},
+        'transaction_count': len(records),
+        'total_amount': round(sum(record['amount'] for record in records), 2),
+        'date_from': dates[0] if dates else None,
+        'date_to': dates[-1] if dates else None,
+        'account_ids': sorted({str(r['account_id']) for r in records if r.get('account_id') is not None}),
+        'narrative': narrative,
+        'sections': parse_sections(narrative),
+        'transactions': records,
+    }
+
+
+def case_document(case):
+    """Plain-text case file for the filing team: header, narrative and the flagged transactions"""
+    lines = [
+        f"SAR CASE: CUSTOMER {case['customer_id']}",
+        f"Period: {case['date_from']} to {case['date_to']}",
+        f"Flagged transactions: {case['transaction_count']} (total ${case['total_amount']:,.2f})",
+        "Rules: " + ', '.join(f"{rule} ({hits})" for rule, hits in case['rule_hits'].items()),
+        '',
+        case['narrative'].strip(),
+        '',
+        'FLAGGED TRANSACTIONS',
+        '====================',
+    ]
+    if case['transactions']:
+        table = io.StringIO()
+        writer = csv.DictWriter(table, fieldnames=list(case['transactions'][0]), extrasaction='ignore')
+        writer.writeheader()
+        writer.writerows(dict(record, rules=', '.join(record.get('rules', []))) for record in case['transactions'])
+        lines.append(table.getvalue())
+    return '\n'.join(lines)
+
+
+def _render(item):
+    case = build_case(*item)
+    return (case['customer_id'], json.dumps(case, default=str), json.dumps(fincen_record(case), default=str),
+            case_document(case))
+
+
+def _safe_name(customer_id, used):
+    name = base = ''.join(c if c.isalnum() or c in '-_' else '_' for c in str(customer_id))
+    suffix = 2
+    # Different ids can sanitize to the same name; number the later ones
+    while name in used:
+        name = f"{base}_{suffix}"
+        suffix += 1
+    used.add(name)
+    return name
+
+
+def export_sar_cases(narratives, flagged_transactions, output_dir, rules_by_customer=None, template_key=None,
+                     chunk_size=64, progress=None):
+    """Writes every drafted case to output_dir as it is rendered.
+
+    Files: cases.jsonl (full case per line), fincen_records.jsonl (FinCEN SAR-style
+    records) and cases.zip (a .txt case file and .json per customer). The exported
+    customers' flagged rows are kept as one frame. Their Python records and rendered
+    files are built chunk_size customers at a time, so only one chunk is held as Python
+    objects. Rendering is pure Python, so it runs in the calling thread; a thread pool
+    would only contend for the GIL. Returns the paths written and the number of cases.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    paths = {name: os.path.join(output_dir, name) for name in ('cases.jsonl', 'fincen_records.jsonl', 'cases.zip')}
+    narratives = dict(narratives)
+    rows, positions = flagged_rows(flagged_transactions, list(narratives))
+    rules_by_customer = rules_by_customer or {}
+
+    customers = iter(narratives)
+    used_names = set()
+    exported = 0
+    with open(paths['cases.jsonl'], 'w') as cases_file, \
+            open(paths['fincen_records.jsonl'], 'w') as fincen_file, \
+            zipfile.ZipFile(paths['cases.zip'], 'w', compression=zipfile.ZIP_DEFLATED) as bundle:
+        while True:
+            chunk_customers = list(islice(customers, chunk_size))
+            if not chunk_customers:
+                break
+            chunk_positions = [positions[c] for c in chunk_customers if c in positions]
+            records = records_by_customer(rows.iloc[np.concatenate(chunk_positions)]) if chunk_positions else {}
+            chunk = [(customer_id, narratives[customer_id], records.get(customer_id, []),
+                      rules_by_customer.get(customer_id), template_key) for customer_id in chunk_customers]
+            for customer_id, case_json, fincen_json, document in map(_render, chunk):
+                cases_file.write(case_json + '\n')
+                fincen_file.write(fincen_json + '\n')
+                name = _safe_name(customer_id, used_names)
+                bundle.writestr(f"cases/{name}.txt", document)
+                bundle.writestr(f"cases/{name}.json", case_json)
+                exported += 1
+            if progress:
+                progress(exported / len(narratives), f"Exported {exported} of {len(narratives)} cases")
+    return {'paths': paths, 'cases': exported}
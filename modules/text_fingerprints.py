@@ -0,0 +1,168 @@
+import re
+import threading
+
+import numpy as np
+import pandas as pd
+
+NUM_PERM = 64
+LSH_BANDS = 16               # 16 bands of 4 rows: pairs above ~0.5 Jaccard usually share a bucket
+SHINGLE_SIZE = 5             # character shingles, robust to small edits in short memos
+SIMILARITY_THRESHOLD = 0.6   # estimated Jaccard similarity for two memos to be near-duplicates
+MIN_CLUSTER_CUSTOMERS = 3
+CHUNK_SIZE = 500             # descriptions hashed per block, bounding the (NUM_PERM x shingles) matrix
+
+_rng = np.random.default_rng(20240501)
+# Permutations h(x) = a*x + b mod 2**32 (a odd) of the 32-bit shingle hashes
+_HASH_A = (_rng.integers(1, 2 ** 32, size=NUM_PERM, dtype=np.uint64) | 1).astype(np.uint32)[:, None]
+_HASH_B = _rng.integers(0, 2 ** 32, size=NUM_PERM, dtype=np.uint64).astype(np.uint32)[:, None]
+
+
+def normalize_description(text):
+    """Lowercase, digits folded to 0 (so reference numbers don't matter), punctuation dropped"""
+    text = re.sub(r"\d", "0", str(text).lower())
+    return re.sub(r"\s+", " ", re.sub(r"[^\w\s]", " ", text)).strip()
+
+
+def _shingles(text, size=SHINGLE_SIZE):
+    if len(text) <= size:
+        return [text] if text else []
+    return [text[i:i + size] for i in range(len(text) - size + 1)]
+
+
+def minhash_signatures(texts, shingle_size=SHINGLE_SIZE):
+    """MinHash signature (NUM_PERM uint32 values) per text; empty texts get all-max rows"""
+    texts = [normalize_description(text) for text in texts]
+    signatures = np.full((len(texts), NUM_PERM), np.iinfo(np.uint32).max, dtype=np.uint32)
+    for start in range(0, len(texts), CHUNK_SIZE):
+        shingles = [_shingles(text, shingle_size) for text in texts[start:start + CHUNK_SIZE]]
+        lengths = np.array([len(s) for s in shingles])
+        if not lengths.any():
+            continue
+        flat = pd.util.hash_array(np.array([s for text_shingles in shingles for s in text_shingles], dtype=object))
+        # (NUM_PERM, shingles) so each text's minimum is a reduction over contiguous memory
+        hashed = _HASH_A * (flat >> np.uint64(32)).astype(np.uint32)
+        hashed += _HASH_B
+        nonempty = np.flatnonzero(lengths)
+        offsets = np.concatenate([[0], np.cumsum(lengths)[:-1]])[nonempty]
+        signatures[start + nonempty] = np.minimum.reduceat(hashed, offsets, axis=1).T
+    return signatures
+
+
+class SignatureCache:
+    """MinHash signatures per transaction, keyed by transaction id and a hash of the description.
+
+    Re-running the rule on the same (or overlapping) data only shingles descriptions that
+    are new or changed. Shared by every session and job in the process. When full, entries
+    the current batch doesn't use are evicted (a single batch larger than max_entries is
+    still cached whole).
+    """
+
+    def __init__(self, max_entries=2_000_000):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._keys = pd.Index(np.empty(0, dtype=np.uint64))
+        self._signatures = np.empty((0, NUM_PERM), dtype=np.uint32)
+
+    def signatures(self, transactions):
+        texts = transactions['description'].fillna('').astype(str).to_numpy(dtype=object)
+        keys = pd.util.hash_pandas_object(pd.DataFrame({
+            'transaction_id': transactions['transaction_id'].to_numpy(),
+            'text': pd.util.hash_array(texts),
+        }), index=False).to_numpy()
+
+        with self._lock:
+            positions = self._keys.get_indexer(keys)
+            missing = np.flatnonzero(positions < 0)
+            if len(missing):
+                new_keys, first = np.unique(keys[missing], return_index=True)
+                new_signatures = minhash_signatures(texts[missing[first]])
+                if len(self._keys) + len(new_keys) > self.max_entries:
+                    # Evict only entries this batch doesn't use, so its hits stay valid
+                    used = np.unique(positions[positions >= 0])
+                    self._keys = self._keys[used]
+                    self._signatures = self._signatures[used]
+                self._keys = self._keys.append(pd.Index(new_keys))
+                self._signatures = np.concatenate([self._signatures, new_signatures])
+                positions = self._keys.get_indexer(keys)
+            return self._signatures[positions]
+
+    def clear(self):
+        with self._lock:
+            self._keys = pd.Index(np.empty(0, dtype=np.uint64))
+            self._signatures = self._signatures[:0]
+
+
+signature_cache = SignatureCache()
+
+
+def _candidate_pairs(signatures, bands=LSH_BANDS):
+    """Pairs that share at least one LSH band bucket (neighbours in each band's sorted order)"""
+    rows = signatures.shape[1] // bands
+    pairs = []
+    for band in range(bands):
+        keys = pd.util.hash_pandas_object(
+            pd.DataFrame(signatures[:, band * rows:(band + 1) * rows]), index=False
+        ).to_numpy()
+        order = np.argsort(keys, kind='stable')
+        same = keys[order[1:]] == keys[order[:-1]]
+        pairs.append(np.column_stack([order[:-1][same], order[1:][same]]))
+    pairs = np.concatenate(pairs)
+    return np.unique(pairs, axis=0) if len(pairs) else pairs
+
+
+def _connected_components(n, pairs):
+    labels = np.arange(n)
+    while len(pairs):
+        low = np.minimum(labels[pairs[:, 0]], labels[pairs[:, 1]])
+        updated = labels.copy()
+        np.minimum.at(updated, pairs[:, 0], low)
+        np.minimum.at(updated, pairs[:, 1], low)
+        updated = updated[updated]
+        if np.array_equal(updated, labels):
+            break
+        labels = updated
+    return labels
+
+
+def near_duplicate_clusters(transactions, threshold=SIMILARITY_THRESHOLD, cache=signature_cache):
+    """Clusters of near-identical descriptions, one row per transaction (aligned with transactions).
+
+    Columns: cluster (-1 when the memo has no near-duplicate), cluster_size and
+    cluster_customers (distinct customers in the cluster). Candidates come from LSH
+    buckets, so the cost grows with the number of similar pairs rather than all pairs.
+    """
+    signatures = cache.signatures(transactions)
+    # Identical memos share a signature; cluster each distinct signature once
+    unique_signatures, inverse = np.unique(signatures, axis=0, return_inverse=True)
+    inverse = inverse.ravel()
+    valid = unique_signatures[:, 0] != np.iinfo(np.uint32).max
+
+    pairs = _candidate_pairs(unique_signatures)
+    if len(pairs):
+        similarity = (unique_signatures[pairs[:, 0]] == unique_signatures[pairs[:, 1]]).mean(axis=1)
+        pairs = pairs[(similarity >= threshold) & valid[pairs[:, 0]] & valid[pairs[:, 1]]]
+    labels = _connected_components(len(unique_signatures), pairs)[inverse]
+    labels[~valid[inverse]] = -1 - np.arange((~valid[inverse]).sum())
+
+    groups = pd.DataFrame({'label': labels, 'customer_id': transactions['customer_id'].to_numpy()})
+    grouped = groups.groupby('label')
+    clusters = pd.DataFrame({
+        'cluster': labels,
+        'cluster_size': grouped['label'].transform('size').to_numpy(),
+        'cluster_customers': grouped['customer_id'].transform('nunique').to_numpy(),
+    }, index=transactions.index)
+    clusters.loc[clusters['cluster_size'] < 2, ['cluster', 'cluster_size', 'cluster_customers']] = [-1, 1, 1]
+    return clusters
+
+
+def near_duplicate_evidence(transactions, threshold=SIMILARITY_THRESHOLD, min_customers=MIN_CLUSTER_CUSTOMERS):
+    """transaction_id -> a sentence describing its memo cluster, for SAR prompts"""
+    clusters = near_duplicate_clusters(transactions, threshold)
+    in_ring = (clusters['cluster_customers'] >= min_customers).to_numpy()
+    return {
+        transaction_id: (f"Description is near-identical to {size - 1} other transactions "
+                         f"from {customers} customers (memo cluster {cluster})")
+        for transaction_id, cluster, size, customers in zip(
+            transactions['transaction_id'].to_numpy()[in_ring], clusters['cluster'].to_numpy()[in_ring],
+            clusters['cluster_size'].to_numpy()[in_ring], clusters['cluster_customers'].to_numpy()[in_ring])
+    }
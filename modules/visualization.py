@@ -1,6 +1,7 @@
-import plotly.express as px
-import plotly.graph_objects as go
-from plotly.subplots import make_subplots
+# plotly is imported inside the chart builders: it is slow to import and most
+# callers (batch jobs, pages without charts) never draw a figure
+from modules.profiling import profiled
+import modules.data_processing  # registers the data.features accessor
 
 class VisualizationTheme:
     """Central theme configuration for all visualizations"""
@@ -240,7 +241,10 @@ class VisualizationTheme:
         </style>
         """
 
+@profiled('viz:transaction_amount_distribution')
 def create_transaction_amount_distribution(data, title="Transaction Amount Distribution"):
+    import plotly.express as px
+
     fig = px.histogram(
         data, 
         x="amount",
@@ -255,7 +259,10 @@ def create_transaction_amount_distribution(data, title="Transaction Amount Distr
     )
     return VisualizationTheme.apply_theme(fig)
 
+@profiled('viz:violations_summary')
 def create_violations_summary(rule_violations_count):
+    import plotly.graph_objects as go
+
     fig = go.Figure(data=[
         go.Bar(
             x=list(rule_violations_count.keys()),
@@ -271,7 +278,11 @@ def create_violations_summary(rule_violations_count):
     )
     return VisualizationTheme.apply_theme(fig)
 
+@profiled('viz:customer_dashboard')
 def create_customer_dashboard(transactions):
+    import plotly.graph_objects as go
+    from plotly.subplots import make_subplots
+
     fig = make_subplots(
         rows=2, cols=2,
         subplot_titles=("Transaction Amounts", "Transaction Types", 
@@ -293,11 +304,15 @@ def create_customer_dashboard(transactions):
     )
     return VisualizationTheme.apply_theme(fig)
 
-def create_preview_dashboard(transactions):
+@profiled('viz:preview_dashboard')
+def create_preview_dashboard(transactions, summaries=None):
     """Creates a professional dashboard for data preview"""
+    import plotly.express as px
+    import plotly.graph_objects as go
+
     # Transaction Volume Over Time
     if 'date' in transactions.columns:
-        daily_volume = transactions.groupby('date').size().reset_index(name='count')
+        daily_volume = transactions.groupby(transactions.features['calendar_day'].rename('date')).size().reset_index(name='count')
         volume_fig = px.line(
             daily_volume, 
             x='date', 
@@ -332,7 +347,11 @@ def create_preview_dashboard(transactions):
     VisualizationTheme.apply_theme(amount_fig)
 
     # Customer Distribution with improved styling
-    customer_dist = transactions.groupby('customer_id')['amount'].sum().sort_values(ascending=True).tail(10)
+    if summaries is None:
+        customer_dist = transactions.groupby('customer_id')['amount'].sum()
+    else:
+        customer_dist = summaries['total_amount']
+    customer_dist = customer_dist.nlargest(10).sort_values(ascending=True)
     types_fig = px.bar(
         x=customer_dist.values,
         y=customer_dist.index,
@@ -350,6 +369,29 @@ def create_preview_dashboard(transactions):
 
     return volume_fig, amount_fig, types_fig
 
+@profiled('viz:threshold_sweep')
+def create_threshold_sweep_chart(sweep, rule_name, parameter='threshold'):
+    """Alert and customer volume per setting of the swept bound, with the production value marked"""
+    import plotly.graph_objects as go
+
+    fig = go.Figure()
+    fig.add_trace(go.Scatter(x=sweep['threshold'], y=sweep['alerts'], name="Alerts",
+                             line=dict(color=VisualizationTheme.COLORS['primary'], width=2)))
+    fig.add_trace(go.Scatter(x=sweep['threshold'], y=sweep['customers'], name="Distinct customers",
+                             line=dict(color=VisualizationTheme.COLORS['accent'], width=2)))
+    if 'overlap_any' in sweep:
+        fig.add_trace(go.Scatter(x=sweep['threshold'], y=sweep['overlap_any'], name="Also flagged by another rule",
+                                 line=dict(color=VisualizationTheme.COLORS['warning'], width=2, dash='dot')))
+    current = sweep.loc[sweep['current'], 'threshold']
+    if not current.empty:
+        fig.add_vline(x=current.iloc[0], line_dash="dash", annotation_text="Current")
+    fig.update_layout(
+        title=f"{parameter.title()} Sweep: {rule_name.replace('_', ' ').title()}",
+        xaxis_title=parameter.title(),
+        yaxis_title="Count"
+    )
+    return VisualizationTheme.apply_theme(fig)
+
 def create_summary_card(title, value, prefix="", suffix=""):
     """Creates a styled metric card"""
     return {
@@ -364,11 +406,19 @@ def create_summary_card(title, value, prefix="", suffix=""):
         }
     }
 
-def create_summary_metrics(transactions):
-    """Creates summary metrics with consistent styling"""
+@profiled('viz:summary_metrics')
+def create_summary_metrics(transactions, summary=None):
+    """Creates summary metrics with consistent styling; a precomputed summary skips the scan"""
+    if summary is None:
+        summary = {
+            'total_transactions': len(transactions),
+            'total_amount': transactions['amount'].sum(),
+            'avg_transaction': transactions['amount'].mean(),
+            'unique_customers': transactions['customer_id'].nunique(),
+        }
     return {
-        "Total Transactions": create_summary_card("Total Transactions", len(transactions)),
-        "Total Volume": create_summary_card("Total Volume", transactions['amount'].sum(), "$"),
-        "Average Transaction": create_summary_card("Average Transaction", transactions['amount'].mean(), "$"),
-        "Unique Customers": create_summary_card("Unique Customers", transactions['customer_id'].nunique())
+        "Total Transactions": create_summary_card("Total Transactions", summary['total_transactions']),
+        "Total Volume": create_summary_card("Total Volume", summary['total_amount'], "$"),
+        "Average Transaction": create_summary_card("Average Transaction", summary['avg_transaction'], "$"),
+        "Unique Customers": create_summary_card("Unique Customers", summary['unique_customers'])
     }
@@ -1,42 +1,78 @@
+import os
 import pandas as pd
+from modules.baselines import compute_customer_profiles, amount_deviation_scores
+from modules.countries import match_countries
+from modules.profiling import span
+from modules.text_fingerprints import near_duplicate_clusters, MIN_CLUSTER_CUSTOMERS, SIMILARITY_THRESHOLD
+
+HIGH_RISK_COUNTRIES_PATH = 'data/high_risk_countries.csv'
+KEYWORDS_PATH = 'data/high_risk_keywords.csv'
 
 # Load high-risk countries from CSV file
-def load_high_risk_countries(file_path='data/high_risk_countries.csv'):
+def load_high_risk_countries(file_path=HIGH_RISK_COUNTRIES_PATH):
     try:
         high_risk_countries_df = pd.read_csv(file_path)
         high_risk_countries = high_risk_countries_df['Name'].tolist()
         return high_risk_countries
     except Exception as e:
-        print(f"Error loading high-risk countries: {e}")
-        return []
-
-high_risk_countries = load_high_risk_countries()
+        raise RuntimeError(f"Error loading high-risk countries from {file_path}: {e}") from e
 
 # Load keywords from CSV file
-def load_keywords(file_path='data/high_risk_keywords.csv'):
+def load_keywords(file_path=KEYWORDS_PATH):
     try:
         keywords_df = pd.read_csv(file_path)
-        keywords = keywords_df['Keyword'].astype(str).tolist()
+        keywords = keywords_df['Keyword'].dropna().astype(str).tolist()
         return keywords
     except Exception as e:
-        print(f"Error loading keywords: {e}")
-        return []
-keywords = load_keywords()
+        raise RuntimeError(f"Error loading keywords from {file_path}: {e}") from e
+
+
+_reference_data = {}
+
+def reference_data(loader, file_path):
+    """Loads reference data on first use, and again only when the file has changed"""
+    try:
+        modified = os.path.getmtime(file_path)
+    except OSError:
+        modified = None  # let the loader report the missing file
+    cached = _reference_data.get((loader, file_path))
+    if cached is None or cached[0] != modified:
+        cached = _reference_data[(loader, file_path)] = (modified, loader(file_path))
+    return cached[1]
+
+def reference_data_signature():
+    """Modification times of the reference lists, so cached rule results can be keyed on them"""
+    return tuple(os.path.getmtime(path) if os.path.exists(path) else None
+                 for path in (HIGH_RISK_COUNTRIES_PATH, KEYWORDS_PATH))
+
+def get_high_risk_countries():
+    return reference_data(load_high_risk_countries, HIGH_RISK_COUNTRIES_PATH)
+
+def get_keywords():
+    return reference_data(load_keywords, KEYWORDS_PATH)
+
+def __getattr__(name):
+    # Module-level names kept for existing callers; loaded on first access
+    if name == 'high_risk_countries':
+        return get_high_risk_countries()
+    if name == 'keywords':
+        return get_keywords()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 
 def detect_high_risk_country_transactions(transactions):
-    return transactions[transactions['country'].isin(high_risk_countries)]
+    return transactions[match_countries(transactions['country'], get_high_risk_countries())]
 
 def detect_keywords_hitting(transactions):
-    pattern = '|'.join(keywords)
+    pattern = '|'.join(get_keywords())
     return transactions[transactions['description'].str.contains(pattern, case=False)]
 
 
-def detect_high_value_cash_deposits(transactions):
-    return transactions[(transactions['transaction_type'] == 'deposit') & (transactions['amount'] > 9000)]
+def detect_high_value_cash_deposits(transactions, threshold=9000):
+    return transactions[(transactions['transaction_type'] == 'deposit') & (transactions['amount'] > threshold)]
 
-def detect_structured_transactions(transactions):
-    return transactions[(transactions['amount'] < 10000) & (transactions['amount'] > 9000)]
+def detect_structured_transactions(transactions, threshold=9000, ceiling=10000):
+    return transactions[(transactions['amount'] < ceiling) & (transactions['amount'] > threshold)]
 
 # def detect_rapid_movement_of_funds(transactions):
 #     return transactions[transactions['velocity'] > 7]
@@ -44,15 +80,106 @@ def detect_structured_transactions(transactions):
 def detect_inconsistent_business_activity(transactions):
     return transactions[transactions['account_balance'] < transactions['amount']]
 
-def detect_high_velocity_cash_activity(transactions):
-    return transactions[transactions['velocity'] > 8]
+def detect_high_velocity_cash_activity(transactions, threshold=8):
+    return transactions[transactions['velocity'] > threshold]
 
 # def detect_third_party_transactions(transactions):
 #     return transactions[transactions['description'].str.contains("third party", case=False)]
 
-def detect_unusual_transaction_patterns(transactions):
-    return transactions[(transactions['amount'] > 5000) & (transactions['transaction_type'] == 'withdrawal') & (transactions['velocity'] > 5)]
+def detect_unusual_transaction_patterns(transactions, threshold=5000):
+    return transactions[(transactions['amount'] > threshold) & (transactions['transaction_type'] == 'withdrawal') & (transactions['velocity'] > 5)]
+
+def detect_large_incoming_wires(transactions, threshold=15000):
+    high_risk_countries = get_high_risk_countries()  # Re-loaded if the file changed during runtime
+    return transactions[(transactions['amount'] > threshold) & (transactions['transaction_type'] == 'transfer') & match_countries(transactions['country'], high_risk_countries)]
+
+def detect_baseline_amount_deviation(transactions, profiles=None, threshold=3.5):
+    # Without stored profiles, the baseline is built from the transactions being scored
+    if profiles is None:
+        profiles = compute_customer_profiles(transactions)
+    return transactions[amount_deviation_scores(transactions, profiles) > threshold]
+
+def detect_near_duplicate_descriptions(transactions, threshold=SIMILARITY_THRESHOLD, min_customers=MIN_CLUSTER_CUSTOMERS):
+    # Near-identical memos reused across several customers, as seen in structuring rings
+    clusters = near_duplicate_clusters(transactions, threshold)
+    return transactions[(clusters['cluster_customers'] >= min_customers).to_numpy()]
+
+
+# Rules available to the app and batch runs, keyed by the name shown in the UI
+RULES = {
+    'high_value_cash_deposits': detect_high_value_cash_deposits,
+    'structured_transactions': detect_structured_transactions,
+    'high_risk_country_transactions': detect_high_risk_country_transactions,
+    # 'rapid_movement_of_funds': detect_rapid_movement_of_funds,
+    # 'inconsistent_business_activity': detect_inconsistent_business_activity,
+    'high_velocity_cash_activity': detect_high_velocity_cash_activity,
+    'keywords_hitting': detect_keywords_hitting,
+    'unusual_transaction_patterns': detect_unusual_transaction_patterns,
+    # 'commingling_of_funds': detect_commingling_of_funds,
+    'large_incoming_wires': detect_large_incoming_wires,
+    'baseline_amount_deviation': detect_baseline_amount_deviation,
+    'near_duplicate_descriptions': detect_near_duplicate_descriptions,
+}
+
+# Rules that compare a customer with other customers. With a customer filter they run on
+# every transaction and only their hits are filtered, otherwise they could never fire.
+CROSS_CUSTOMER_RULES = {'near_duplicate_descriptions'}
+
+# Rules scored against customer profiles; given stored profiles (see baselines.ProfileStore)
+# they use them, otherwise they build a baseline from the transactions being scored
+PROFILE_RULES = {'baseline_amount_deviation'}
+
+# Tunable rules for threshold backtesting: rule -> the values its `threshold` is compared
+# against (a rule flags its other conditions AND value > threshold)
+THRESHOLD_SWEEPS = {
+    'high_value_cash_deposits': lambda transactions: transactions['amount'],
+    'structured_transactions': lambda transactions: transactions['amount'],
+    'high_velocity_cash_activity': lambda transactions: transactions['velocity'],
+    'unusual_transaction_patterns': lambda transactions: transactions['amount'],
+    'large_incoming_wires': lambda transactions: transactions['amount'],
+    'baseline_amount_deviation': lambda transactions, profiles=None: amount_deviation_scores(
+        transactions, compute_customer_profiles(transactions) if profiles is None else profiles),
+}
+# Upper bounds that can be swept too (rows alert while the THRESHOLD_SWEEPS value is below
+# the bound), by rule: the parameter name of each bound
+CEILING_SWEEPS = {
+    'structured_transactions': ['ceiling'],
+}
+
+
+def rule_kwargs(rule_name, profiles=None):
+    """Extra arguments for a rule: stored profiles for PROFILE_RULES, when there are any"""
+    return {'profiles': profiles} if profiles is not None and rule_name in PROFILE_RULES else {}
+
+
+def apply_red_flag_rules(transactions, selected_rules, customer_id=None, profiles=None):
+    all_transactions = transactions
+    if customer_id:
+        with span('filter_customer', rows=len(transactions)):
+            transactions = transactions[transactions['customer_id'] == customer_id]
+
+    flagged_transactions = {}
+    for rule_name in selected_rules:
+        if rule_name in RULES:
+            if customer_id and rule_name in CROSS_CUSTOMER_RULES:
+                with span(f"rule:{rule_name}", rows=len(all_transactions)) as record:
+                    hits = RULES[rule_name](all_transactions)
+                    flagged_transactions[rule_name] = hits[hits['customer_id'] == customer_id]
+                    record['hits'] = len(flagged_transactions[rule_name])
+                continue
+            with span(f"rule:{rule_name}", rows=len(transactions)) as record:
+                flagged_transactions[rule_name] = RULES[rule_name](transactions, **rule_kwargs(rule_name, profiles))
+                record['hits'] = len(flagged_transactions[rule_name])
+    return flagged_transactions
+
 
-def detect_large_incoming_wires(transactions):
-    high_risk_countries = load_high_risk_countries()  # Re-load in case of changes during runtime
-    return transactions[(transactions['amount'] > 15000) & (transactions['transaction_type'] == 'transfer') & (transactions['country'].isin(high_risk_countries))]
\ No newline at end of file
+# Function to get customers with multiple rule violations
+def get_customers_with_multiple_violations(flagged_transactions):
+    with span('aggregate:multiple_violations', rows=sum(len(d) for d in flagged_transactions.values())):
+        customer_violations = {}
+        for rule, dataset in flagged_transactions.items():
+            for customer_id in dataset['customer_id']:
+                if customer_id not in customer_violations:
+                    customer_violations[customer_id] = set()
+                customer_violations[customer_id].add(rule)
+        return {customer: rules for customer, rules in customer_violations.items() if len(rules) > 1}
@@ -1,38 +1,31 @@
 # sar_generator.py
-import json
-from openai import OpenAI
+from modules.profiling import profiled
+from modules.prompt_templates import get_template
 
-# Set up the LLM client
-client = OpenAI(base_url="http://localhost:1234/v1", api_key="lm-studio")
+_client = None
 
-def generate_sar_narrative(customer_id, violations, transactions):
-    try:
-        prompt = f"""
-        You are a compliance officer tasked with generating a Suspicious Activity Report (SAR) narrative.
-
-        Customer ID: {customer_id}
+def get_client():
+    """The LM Studio client, created (and the openai SDK imported) on first use"""
+    global _client
+    if _client is None:
+        from openai import OpenAI
 
-        The customer has violated the following red flag rules: {', '.join(violations)}.
+        _client = OpenAI(base_url="http://localhost:1234/v1", api_key="lm-studio")
+    return _client
 
-        Below are the transaction details:
+PROMPT_TEMPLATE = get_template('sar_compliance_officer')
 
-        {json.dumps(transactions, indent=2)}
+def build_sar_prompt(customer_id, violations, transactions):
+    return PROMPT_TEMPLATE.user_message(customer_id, violations, transactions)
 
-        Please generate a comprehensive SAR narrative that includes:
-        1. A clear description of each suspicious activity and why it is considered suspicious (Who conducted the activity? What types of transactions were involved?).
-        2. Specific transaction details that highlight the suspicious behavior (When did the transactions occur? Where did the activity take place?).
-        3. Any patterns or connections between the transactions.
-        4. The potential implications of these activities and why they raise red flags (Why does the Bank think the activity is suspicious? How did the suspicious activity occur?).
-        5. An introductory paragraph providing information on the financial institution, the subject(s) of the SAR, the account(s) involved, the date range of the suspicious activity, the nature of the suspicious activity, and the total amount of the suspicious activity.
-        6. A conclusion paragraph indicating any follow-up planned by the institution and any other pertinent information.
-
-        Ensure the narrative is clear, concise, and suitable for submission to regulatory authorities.
-        EXTREMELY IMPORTANT: Ensure that the narrative is compliant with the Bank Secrecy Act (BSA) and other relevant regulations, and it should must follow the offical format.
-        """
-        completion = client.chat.completions.create(
+@profiled('narrative:lm_studio', rows_arg=2)
+def generate_sar_narrative(customer_id, violations, transactions):
+    try:
+        prompt = build_sar_prompt(customer_id, violations, transactions)
+        completion = get_client().chat.completions.create(
             model="microsoft/Phi-3-mini-4k-instruct-gguf",
             messages=[
-                {"role": "system", "content": "You are a compliance officer EXPERT in writing and generating SAR narratives."},
+                {"role": "system", "content": PROMPT_TEMPLATE.system},
                 {"role": "user", "content": prompt}
             ],
             temperature=0.7,
@@ -0,0 +1,139 @@
+# sar_local.py
+import asyncio
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from modules.profiling import span
+from modules.prompt_templates import get_template
+
+SECTIONS = ["SUMMARY OF SUSPICIOUS ACTIVITY", "CUSTOMER DETAILS",
+            "TRANSACTION PATTERNS", "RED FLAGS IDENTIFIED", "CONCLUSION"]
+
+PROMPT_TEMPLATE = get_template('sar_structured')
+
+# Customers per /v1/completions call; also how many customers the app groups per batch draft
+MAX_BATCH_SIZE = 8
+
+
+class LocalBatchBackend:
+    """Drafts narratives on a local OpenAI-compatible server (llama.cpp, vLLM, LM Studio).
+
+    With batch_prompts, up to max_batch_size customers go to the server as one
+    /v1/completions call with a list of prompts. Without it, each customer is sent as
+    its own chat request, max_concurrency at a time, so servers with continuous
+    batching can schedule them together.
+    """
+
+    def __init__(self, base_url="http://localhost:1234/v1", api_key="local",
+                 model="microsoft/Phi-3-mini-4k-instruct-gguf", batch_prompts=True,
+                 max_batch_size=MAX_BATCH_SIZE, max_concurrency=4, max_tokens=1500, temperature=0.6, timeout=600):
+        from openai import OpenAI  # imported here so StubBackend works without the SDK
+
+        self.client = OpenAI(base_url=base_url, api_key=api_key, timeout=timeout)
+        self.model = model
+        self.batch_prompts = batch_prompts
+        self.max_batch_size = max_batch_size
+        self.max_concurrency = max_concurrency
+        self.max_tokens = max_tokens
+        self.temperature = temperature
+
+    def _complete_batch(self, requests):
+        prompts = [PROMPT_TEMPLATE.completion_prompt(*request) for request in requests]
+        with span('narrative:local_batch', rows=len(prompts)):
+            completion = self.client.completions.create(
+                model=self.model,
+                prompt=prompts,
+                max_tokens=self.max_tokens,
+                temperature=self.temperature,
+                extra_body={'cache_prompt': True},
+            )
+        texts = [''] * len(prompts)
+        for choice in completion.choices:
+            texts[choice.index] = choice.text.strip()
+        return texts
+
+    def _chat(self, request):
+        with span('narrative:local', rows=len(request[2])):
+            completion = self.client.chat.completions.create(
+                model=self.model,
+                messages=PROMPT_TEMPLATE.messages(*request),
+                max_tokens=self.max_tokens,
+                temperature=self.temperature,
+                extra_body={'cache_prompt': True},
+            )
+        return completion.choices[0].message.content.strip()
+
+    def generate_batch(self, requests):
+        """Narratives for a list of (customer_id, rules, transactions) requests, in order"""
+        requests = list(requests)
+        if self.batch_prompts:
+            batches = [requests[i:i + self.max_batch_size] for i in range(0, len(requests), self.max_batch_size)]
+            with ThreadPoolExecutor(max_workers=self.max_concurrency) as executor:
+                return [text for texts in executor.map(self._complete_batch, batches) for text in texts]
+        with ThreadPoolExecutor(max_workers=self.max_concurrency) as executor:
+            return list(executor.map(self._chat, requests))
+
+
+class StubBackend:
+    """Deterministic narratives built from the inputs alone, for tests and offline development"""
+
+    def generate_batch(self, requests):
+        return [self._draft(*request) for request in requests]
+
+    def _draft(self, customer_id, rules, transactions):
+        amounts = [float(t.get('amount', 0)) for t in transactions]
+        dates = sorted(str(t['date']) for t in transactions if 'date' in t)
+        period = f"{dates[0]} to {dates[-1]}" if dates else "an unknown period"
+        body = {
+            "SUMMARY OF SUSPICIOUS ACTIVITY": f"{len(transactions)} transactions totalling ${sum(amounts):,.2f} "
+                                              f"between {period}.",
+            "CUSTOMER DETAILS": f"Customer {customer_id}.",
+            "TRANSACTION PATTERNS": f"Largest transaction ${max(amounts, default=0):,.2f}; "
+                                    f"average ${(sum(amounts) / len(amounts)) if amounts else 0:,.2f}.",
+            "RED FLAGS IDENTIFIED": '\n'.join(f"- {rule}" for rule in rules) or "- None",
+            "CONCLUSION": "Stub narrative generated without a language model.",
+        }
+        return '\n\n'.join(f"{section}\n{body[section]}" for section in SECTIONS)
+
+
+_backends = {}
+
+
+def get_backend(name=None):
+    """Shared backend instance: 'stub' or 'local' (default taken from SARGEN_SAR_BACKEND)"""
+    name = name or os.environ.get('SARGEN_SAR_BACKEND', 'local')
+    if name not in _backends:
+        if name == 'stub':
+            _backends[name] = StubBackend()
+        else:
+            _backends[name] = LocalBatchBackend(
+                base_url=os.environ.get('SARGEN_LOCAL_LLM_URL', "http://localhost:1234/v1"),
+                model=os.environ.get('SARGEN_LOCAL_LLM_MODEL', "microsoft/Phi-3-mini-4k-instruct-gguf"),
+            )
+    return _backends[name]
+
+
+def generate_sar_narratives(requests, backend=None):
+    """Drafts narratives for many customers; errors are returned in place of a narrative"""
+    backend = backend or get_backend()
+    requests = list(requests)
+    try:
+        return backend.generate_batch(requests)
+    except Exception as e:
+        return [f"Error generating SAR narrative: {e}"] * len(requests)
+
+
+def generate_sar_narrative(customer_id, rules, transactions, backend=None):
+    return generate_sar_narratives([(customer_id, rules, transactions)], backend)[0]
+
+
+async def generate_sar_narratives_async(requests, backend=None):
+    """Async generate_sar_narratives for the app's batch drafts; raises on failure instead of returning errors"""
+    backend = backend or get_backend()
+    return await asyncio.to_thread(backend.generate_batch, list(requests))
+
+
+async def generate_sar_narrative_async(customer_id, rules, transactions, backend=None):
+    """Async variant for drafting many customers at once; raises on failure instead of returning the error"""
+    narratives = await generate_sar_narratives_async([(customer_id, rules, transactions)], backend)
+    return narratives[0]
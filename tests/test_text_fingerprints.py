@@ -0,0 +1,21 @@
+import numpy as np
+import pandas as pd
+
+from modules.text_fingerprints import SignatureCache, minhash_signatures
+
+
+def _transactions(n):
+    return pd.DataFrame({
+        'transaction_id': np.arange(1, n + 1),
+        'description': [f"payment {chr(97 + i) * 6} invoice" for i in range(n)],
+    })
+
+
+def test_signature_cache_eviction_keeps_batch_hits():
+    cache = SignatureCache(max_entries=5)
+    cache.signatures(_transactions(4))
+    transactions = _transactions(6)
+    expected = minhash_signatures(transactions['description'])
+    np.testing.assert_array_equal(cache.signatures(transactions), expected)
+    # Evicted or not, a later lookup still matches a fresh computation
+    np.testing.assert_array_equal(cache.signatures(transactions.iloc[:3]), expected[:3])